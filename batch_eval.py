@@ -0,0 +1,91 @@
+# 批量局面评估: 输入 (N, size, size) 的 int8 棋盘栈, 一次算出 N 个局面的结果 (需要 numpy)
+import numpy as np
+
+from game_core import EMPTY, BLACK, WHITE, REVERSI_WEIGHTS
+
+# 五子棋: 只含己方 k 子、不含敌子的五格窗口, 按 k 计分
+GOMOKU_WINDOW_SCORE = np.array([0, 1, 10, 100, 1000, 100000], dtype=np.int64)
+REVERSI_W = np.array(REVERSI_WEIGHTS, dtype=np.int32)
+
+def stack_boards(items):
+    """把若干 game 对象或二维棋盘转成 (N, size, size) 的 int8 数组"""
+    return np.array([getattr(x, 'board', x) for x in items], dtype=np.int8)
+
+def _windows5(m):
+    """m: (N, s, s) 0/1 数组. 返回4个方向上每个五格窗口的和, 形状各不相同"""
+    s = m.shape[1]; k = s - 4
+    return [
+        sum(m[:, :, i:i+k] for i in range(5)),              # 横
+        sum(m[:, i:i+k, :] for i in range(5)),              # 竖
+        sum(m[:, i:i+k, i:i+k] for i in range(5)),          # 主对角
+        sum(m[:, i:i+k, 4-i:4-i+k] for i in range(5)),      # 副对角
+    ]
+
+def gomoku_window_counts(boards, color):
+    """每个局面中 color 的"纯窗口"计数: 返回 (N, 6), 第 k 列为只含 k 个己方子且无敌子的窗口数"""
+    boards = np.asarray(boards, dtype=np.int8)
+    n = boards.shape[0]
+    if boards.shape[1] < 5: return np.zeros((n, 6), dtype=np.int64)
+    opp = WHITE if color == BLACK else BLACK
+    own_w = _windows5((boards == color).astype(np.int8))
+    opp_w = _windows5((boards == opp).astype(np.int8))
+    out = np.zeros((n, 6), dtype=np.int64)
+    for ow, pw in zip(own_w, opp_w):
+        clean = pw == 0
+        for k in range(6):
+            out[:, k] += ((ow == k) & clean).reshape(n, -1).sum(axis=1)
+    return out
+
+def gomoku_winners(boards):
+    """各局面的连五方: 0 表示没有, 双方都有时记为黑方"""
+    boards = np.asarray(boards, dtype=np.int8)
+    res = np.zeros(boards.shape[0], dtype=np.int8)
+    if boards.shape[1] < 5: return res
+    for color in (WHITE, BLACK):
+        five = np.zeros(boards.shape[0], dtype=bool)
+        for w in _windows5((boards == color).astype(np.int8)):
+            five |= (w == 5).reshape(boards.shape[0], -1).any(axis=1)
+        res[five] = color
+    return res
+
+def gomoku_scores(boards, color):
+    """color 视角的棋型分: 己方窗口分 - 对方窗口分"""
+    opp = WHITE if color == BLACK else BLACK
+    return gomoku_window_counts(boards, color) @ GOMOKU_WINDOW_SCORE - \
+           gomoku_window_counts(boards, opp) @ GOMOKU_WINDOW_SCORE
+
+def _shift(m, dr, dc):
+    """整体平移 (dr, dc), 移出的部分丢弃, 空出的部分补 False"""
+    out = np.zeros_like(m)
+    s = m.shape[1]
+    rs, rd = (slice(0, s-dr), slice(dr, s)) if dr >= 0 else (slice(-dr, s), slice(0, s+dr))
+    cs, cd = (slice(0, s-dc), slice(dc, s)) if dc >= 0 else (slice(-dc, s), slice(0, s+dc))
+    out[:, rd, cd] = m[:, rs, cs]
+    return out
+
+def reversi_mobility(boards, color):
+    """color 的合法着法数, 8个方向上的平移传播, 与 bb_moves 同一思路"""
+    boards = np.asarray(boards, dtype=np.int8)
+    own = boards == color
+    opp = boards == (WHITE if color == BLACK else BLACK)
+    empty = boards == EMPTY
+    moves = np.zeros_like(own)
+    for dr, dc in ((0,1),(0,-1),(1,0),(-1,0),(1,1),(1,-1),(-1,1),(-1,-1)):
+        t = _shift(own, dr, dc) & opp
+        for _ in range(boards.shape[1] - 3): t |= _shift(t, dr, dc) & opp
+        moves |= _shift(t, dr, dc) & empty
+    return moves.reshape(boards.shape[0], -1).sum(axis=1)
+
+def reversi_scores(boards, color, mobility_weight=5):
+    """color 视角: 位置权重分 + mobility_weight * 行动力差 (只支持 8x8)"""
+    boards = np.asarray(boards, dtype=np.int8)
+    opp = WHITE if color == BLACK else BLACK
+    pos = ((boards == color) * REVERSI_W - (boards == opp) * REVERSI_W).reshape(boards.shape[0], -1).sum(axis=1)
+    if not mobility_weight: return pos
+    return pos + mobility_weight * (reversi_mobility(boards, color) - reversi_mobility(boards, opp))
+
+def go_stone_counts(boards):
+    """(N, 2): 每个局面的黑子数、白子数"""
+    boards = np.asarray(boards, dtype=np.int8)
+    flat = boards.reshape(boards.shape[0], -1)
+    return np.stack([(flat == BLACK).sum(axis=1), (flat == WHITE).sum(axis=1)], axis=1)
@@ -0,0 +1,134 @@
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+
+from game_core import GameFactory, AIFactory, ReversiGame, TranspositionTable, np
+
+# 黑白棋标准 perft 结果 (Pass 算一步), 用于校验走法生成
+REVERSI_PERFT = {1: 4, 2: 12, 3: 56, 4: 244, 5: 1396, 6: 8200, 7: 55092, 8: 390216, 9: 3005288}
+
+def perft(game, depth):
+    """从当前局面往下 depth 步的叶子数, 走 place_stone/undo 以覆盖完整的规则代码"""
+    if depth == 0 or game.game_over: return 1
+    moves = game.get_valid_moves(game.current_player)
+    total = 0
+    for r, c in moves:
+        mark = len(game.undo_stack)
+        game.place_stone(r, c)
+        # 对方无棋时 ReversiGame 自动 Pass, 这里把 Pass 也算一步
+        passed = game.move_history[-1] == "PASS"
+        if passed and depth > 1: total += perft(game, depth - 2)
+        else: total += perft(game, depth - 1)
+        while len(game.undo_stack) > mark: game.undo()
+    return total
+
+def run_perft(max_depth=6):
+    res = {}
+    for bb in (True, False):
+        name = "bitboard" if bb else "list"
+        for d in range(1, max_depth + 1):
+            g = ReversiGame(8, use_bitboard=bb)
+            t = time.time(); n = perft(g, d); el = time.time() - t
+            exp = REVERSI_PERFT.get(d)
+            res[f"perft/reversi-{name}/d{d}"] = {"nodes": n, "expected": exp, "ok": exp is None or n == exp,
+                                                 "time": round(el, 4), "nps": int(n / el) if el > 0 else 0}
+    return res
+
+def fixed_position(gtype, size, plies, seed=1):
+    """用固定种子随机走 plies 步得到的测试局面"""
+    rng = random.Random(seed)
+    g = GameFactory.create_game(gtype, size)
+    for _ in range(plies):
+        moves = g.get_valid_moves(g.current_player)
+        if not moves or g.game_over: break
+        g.place_stone(*rng.choice(moves))
+    return g
+
+def timeit(fn, min_time=0.5):
+    """反复调用 fn 至少 min_time 秒, 返回 (次数, 用时)"""
+    n, start = 0, time.time()
+    while True:
+        fn(); n += 1
+        el = time.time() - start
+        if el >= min_time: return n, el
+
+def run_throughput(min_time=0.5, ai_time=0.2):
+    res = {}
+    def record(name, fn):
+        n, el = timeit(fn, min_time)
+        res[name] = {"n": n, "time": round(el, 4), "ops_per_sec": round(n / el, 1)}
+
+    for gtype, size, plies in (("gomoku", 15, 30), ("reversi", 8, 20), ("go", 9, 30), ("go", 19, 120)):
+        tag = f"{gtype}{size}"
+        g = fixed_position(gtype, size, plies)
+        moves = g.get_valid_moves(g.current_player)
+        rng = random.Random(2)
+        def place_undo():
+            r, c = rng.choice(moves)
+            if g.place_stone(r, c)[0]:
+                while len(g.move_history) > plies: g.undo()
+        record(f"{tag}/place_stone+undo", place_undo)
+        record(f"{tag}/get_valid_moves", lambda: g.get_valid_moves(g.current_player))
+        if gtype == 'go': # 围棋的 _check_winner 只在连续两次 Pass 后才数子, 平时是空操作, 直接测数子
+            record(f"{tag}/area_score", g.area_score)
+            if np is not None:
+                record(f"{tag}/area_score_numpy", lambda: g.area_score(use_numpy=True))
+                res[f"{tag}/area_score_numpy"]["ok"] = g.area_score(use_numpy=True) == g.area_score()
+        else: record(f"{tag}/check_winner", g._check_winner)
+
+        # AI 每次都用新的置换表, 避免命中上一次的缓存
+        ai = AIFactory.create_ai(gtype)
+        if hasattr(ai, 'time_limit'): ai.time_limit = ai_time
+        def think():
+            ai.tt = TranspositionTable()
+            if hasattr(ai, 'root'): ai.root = None
+            ai.get_move(g)
+        record(f"{tag}/ai_get_move", think)
+        if getattr(ai, 'stats', None): res[f"{tag}/ai_get_move"]["stats"] = ai.stats
+    return res
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+def compare(old, new):
+    """打印两次结果的对比: 吞吐量比值 (>1 表示变快)"""
+    for k, v in new["results"].items():
+        o = old.get("results", {}).get(k)
+        if not o: continue
+        if "ops_per_sec" in v: print(f"{k:40s} {o['ops_per_sec']:>12} -> {v['ops_per_sec']:>12}  x{v['ops_per_sec'] / o['ops_per_sec']:.2f}")
+        elif "nps" in v and o.get("nps"): print(f"{k:40s} {o['nps']:>12} -> {v['nps']:>12}  x{v['nps'] / o['nps']:.2f}")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="game_core 性能基准")
+    ap.add_argument("--perft", type=int, default=6, help="黑白棋 perft 最大深度")
+    ap.add_argument("--min-time", type=float, default=0.5, help="每项吞吐测试的最短时长(秒)")
+    ap.add_argument("--ai-time", type=float, default=0.2, help="AI 每步思考时间(秒)")
+    ap.add_argument("--skip-throughput", action="store_true")
+    ap.add_argument("-o", "--out", default=None, help="结果写入 JSON 文件")
+    ap.add_argument("--compare", default=None, help="与之前的 JSON 结果对比")
+    a = ap.parse_args(argv)
+
+    results = run_perft(a.perft)
+    if not a.skip_throughput: results.update(run_throughput(a.min_time, a.ai_time))
+    report = {"commit": git_commit(), "python": platform.python_version(), "time": int(time.time()), "results": results}
+    text = json.dumps(report, indent=2)
+    if a.out:
+        with open(a.out, 'w') as f: f.write(text)
+    else: print(text)
+    if a.compare:
+        with open(a.compare) as f: compare(json.load(f), report)
+    bad = [k for k, v in results.items() if v.get("ok") is False]
+    if bad:
+        print("perft 校验失败: " + ", ".join(bad), file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,289 @@
+import argparse
+import json
+import os
+import sqlite3
+import struct
+import time
+import zlib
+
+# 对局库: 数据文件只追加, 每局一条紧凑的二进制记录; 旁边一个 SQLite 索引按棋手/棋种/日期查
+#   数据文件: magic 'GAR1', 然后是若干条记录
+#   记录    : varint(正文长度) 正文 crc32(u32)
+#   正文    : 棋种(u8) 尺寸(u8) 结果(u8) varint(时间戳) str(黑方) str(白方) varint(手数) 着法...
+#   str     : varint(字节数) + UTF-8
+#   着法    : varint, r*size+c+1, 0 表示 Pass
+ARCHIVE_MAGIC = b'GAR1'
+GAME_CODES = {'gomoku': 0, 'reversi': 1, 'go': 2}
+GAME_NAMES = {v: k for k, v in GAME_CODES.items()}
+RESULT_NONE, RESULT_DRAW = 0, 3 # 1/2 为黑/白胜, 与 BLACK/WHITE 相同
+COMMIT_EVERY = 256 # 追加这么多局才刷盘并提交索引一次
+CRC = struct.Struct('<I')
+
+def put_varint(out, n):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80); n >>= 7
+    out.append(n)
+
+def get_varint(buf, pos):
+    """返回 (值, 新位置)"""
+    n = shift = 0
+    while True:
+        b = buf[pos]; pos += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80: return n, pos
+        shift += 7
+
+def _put_str(out, s):
+    b = s.encode('utf-8')
+    put_varint(out, len(b)); out += b
+
+def _get_str(buf, pos):
+    n, pos = get_varint(buf, pos)
+    return bytes(buf[pos:pos + n]).decode('utf-8'), pos + n
+
+class GameRecord:
+    __slots__ = ('id', 'gtype', 'size', 'result', 'ts', 'black', 'white', 'moves')
+
+    def __init__(self, gtype, size, moves, black="", white="", result=RESULT_NONE, ts=0, id=None):
+        self.id = id
+        self.gtype, self.size = gtype, size
+        self.moves = moves # [(r, c) 或 "PASS"]
+        self.black, self.white = black, white
+        self.result, self.ts = result, ts
+
+    @property
+    def winner(self):
+        return self.result if self.result in (1, 2) else None
+
+    def encode(self):
+        out = bytearray((GAME_CODES[self.gtype], self.size, self.result))
+        put_varint(out, int(self.ts))
+        _put_str(out, self.black); _put_str(out, self.white)
+        put_varint(out, len(self.moves))
+        for m in self.moves: put_varint(out, 0 if m == "PASS" else m[0] * self.size + m[1] + 1)
+        return bytes(out)
+
+    @staticmethod
+    def decode(body, id=None):
+        gtype, size, result = GAME_NAMES[body[0]], body[1], body[2]
+        ts, pos = get_varint(body, 3)
+        black, pos = _get_str(body, pos)
+        white, pos = _get_str(body, pos)
+        n, pos = get_varint(body, pos)
+        moves = []
+        for _ in range(n):
+            v, pos = get_varint(body, pos)
+            moves.append("PASS" if v == 0 else divmod(v - 1, size))
+        return GameRecord(gtype, size, moves, black, white, result, ts, id)
+
+    def to_game(self, upto=None):
+        """按规则重放成 game 对象, upto 为重放的手数"""
+        from game_core import GameFactory
+        g = GameFactory.create_game(self.gtype, self.size)
+        for i, m in enumerate(self.moves[:upto]):
+            if m == "PASS":
+                if len(g.move_history) > i: continue # 黑白棋的 Pass 由规则自动补上
+                if hasattr(g, 'pass_turn'): g.pass_turn()
+            else: g.place_stone(m[0], m[1])
+        return g
+
+    @staticmethod
+    def from_game(game, gtype, black="", white="", ts=None):
+        if game.game_over: result = game.winner if game.winner in (1, 2) else RESULT_DRAW
+        else: result = RESULT_NONE
+        moves = [m if m == "PASS" else (m[0], m[1]) for m in game.move_history]
+        return GameRecord(gtype, game.size, moves, black, white, result, int(time.time() if ts is None else ts))
+
+class GameArchive:
+    """追加写的对局库. 索引可由数据文件重建, 打开时自动补上崩溃前没进索引的记录"""
+    def __init__(self, path):
+        self.path = path
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.f = open(path, 'a+b')
+        if new: self.f.write(ARCHIVE_MAGIC); self.f.flush()
+        else:
+            self.f.seek(0)
+            if self.f.read(4) != ARCHIVE_MAGIC: raise ValueError("对局库格式不符")
+        self.db = sqlite3.connect(path + ".idx")
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS games (id INTEGER PRIMARY KEY, offset INTEGER NOT NULL, "
+                        "gtype TEXT, size INTEGER, black TEXT, white TEXT, result INTEGER, ts INTEGER, moves INTEGER)")
+        for col in ("black", "white"): self.db.execute(f"CREATE INDEX IF NOT EXISTS games_{col} ON games ({col}, ts)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS games_type ON games (gtype, ts)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS games_ts ON games (ts)")
+        self.pending = 0
+        self._recover()
+
+    def _recover(self):
+        """把索引之后的完整记录补进索引, 截掉末尾写了一半的记录"""
+        row = self.db.execute("SELECT offset FROM games ORDER BY id DESC LIMIT 1").fetchone()
+        start = len(ARCHIVE_MAGIC)
+        if row:
+            start = row[0]
+            rec = self._read_at(start)
+            if rec is None: raise ValueError("索引与数据文件不一致, 请删除 .idx 重建")
+            start = rec[1]
+        end = start
+        for off, nxt, body in self._records(start):
+            self._index(off, GameRecord.decode(body)); end = nxt
+        self.f.seek(0, os.SEEK_END)
+        if self.f.tell() > end: self.f.truncate(end)
+        self.flush()
+
+    def _records(self, offset):
+        """从 offset 开始顺序读记录: (位置, 下一条位置, 正文); 遇到不完整或校验失败即停"""
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            buf, base, pos = b'', offset, 0 # buf[0] 在文件中的位置是 base
+            while True:
+                if len(buf) - pos < 10: # 分块续读, 不一次读入整个文件
+                    buf, base, pos = buf[pos:] + f.read(1 << 20), base + pos, 0
+                    if not buf: return
+                try: n, p = get_varint(buf, pos)
+                except IndexError: return
+                if p + n + 4 > len(buf): # 记录跨块
+                    buf, base, p, pos = buf[pos:] + f.read(max(1 << 20, p + n + 4 - len(buf))), base + pos, p - pos, 0
+                    if p + n + 4 > len(buf): return
+                body = buf[p:p + n]
+                if CRC.unpack_from(buf, p + n)[0] != zlib.crc32(body): return
+                yield base + pos, base + p + n + 4, body
+                pos = p + n + 4
+
+    def _read_at(self, offset):
+        """读一条记录: (正文, 下一条位置), 损坏返回 None"""
+        self.f.seek(offset)
+        head = self.f.read(10)
+        try: n, p = get_varint(head, 0)
+        except IndexError: return None
+        self.f.seek(offset + p)
+        data = self.f.read(n + 4)
+        if len(data) < n + 4 or CRC.unpack_from(data, n)[0] != zlib.crc32(data[:n]): return None
+        return data[:n], offset + p + n + 4
+
+    def _index(self, offset, rec):
+        cur = self.db.execute("INSERT INTO games (offset, gtype, size, black, white, result, ts, moves) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                              (offset, rec.gtype, rec.size, rec.black, rec.white, rec.result, rec.ts, len(rec.moves)))
+        rec.id = cur.lastrowid
+        self.pending += 1
+        if self.pending >= COMMIT_EVERY: self.flush()
+
+    def append(self, rec):
+        """追加一局, 返回编号; 先写数据再记索引, 崩溃时索引由 _recover 补齐"""
+        body = rec.encode()
+        out = bytearray()
+        put_varint(out, len(body))
+        out += body; out += CRC.pack(zlib.crc32(body))
+        self.f.seek(0, os.SEEK_END)
+        offset = self.f.tell()
+        self.f.write(out)
+        self._index(offset, rec)
+        return rec.id
+
+    def append_game(self, game, gtype, black="", white="", ts=None):
+        return self.append(GameRecord.from_game(game, gtype, black, white, ts))
+
+    def flush(self):
+        self.f.flush()
+        self.db.commit()
+        self.pending = 0
+
+    def get(self, gid):
+        row = self.db.execute("SELECT offset FROM games WHERE id = ?", (gid,)).fetchone()
+        if not row: return None
+        self.f.flush()
+        rec = self._read_at(row[0])
+        return GameRecord.decode(rec[0], gid) if rec else None
+
+    def find(self, player=None, gtype=None, since=None, until=None, result=None, limit=None, newest_first=True):
+        """按索引查, 逐条读出记录 (生成器, 不会一次载入); since/until 为时间戳"""
+        cond, args = [], []
+        if player is not None: cond.append("(black = ? OR white = ?)"); args += [player, player]
+        if gtype is not None: cond.append("gtype = ?"); args.append(gtype)
+        if since is not None: cond.append("ts >= ?"); args.append(int(since))
+        if until is not None: cond.append("ts < ?"); args.append(int(until))
+        if result is not None: cond.append("result = ?"); args.append(result)
+        sql = "SELECT id, offset FROM games"
+        if cond: sql += " WHERE " + " AND ".join(cond)
+        sql += " ORDER BY ts DESC, id DESC" if newest_first else " ORDER BY ts, id"
+        if limit: sql += f" LIMIT {int(limit)}"
+        self.f.flush()
+        for gid, off in self.db.execute(sql, args):
+            rec = self._read_at(off)
+            if rec: yield GameRecord.decode(rec[0], gid)
+
+    def count(self, player=None, gtype=None):
+        cond, args = [], []
+        if player is not None: cond.append("(black = ? OR white = ?)"); args += [player, player]
+        if gtype is not None: cond.append("gtype = ?"); args.append(gtype)
+        sql = "SELECT COUNT(*) FROM games" + (" WHERE " + " AND ".join(cond) if cond else "")
+        return self.db.execute(sql, args).fetchone()[0]
+
+    def scan(self):
+        """按写入顺序流式遍历全部对局, 内存只占一个读缓冲"""
+        self.f.flush()
+        for gid, (off, nxt, body) in enumerate(self._records(len(ARCHIVE_MAGIC)), 1):
+            yield GameRecord.decode(body, gid)
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM games").fetchone()[0]
+
+    def close(self):
+        if self.f.closed: return
+        self.flush(); self.f.close(); self.db.close()
+
+def import_file(archive, path):
+    """导入 save_to_file 存的 .json 或 selfplay 输出的 .jsonl, 返回导入局数"""
+    t_map = {'GomokuGame': 'gomoku', 'GoGame': 'go', 'ReversiGame': 'reversi'}
+    n = 0
+    with open(path, encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            for line in f:
+                d = json.loads(line)
+                if d.get('history') is None: continue
+                w = d.get('winner')
+                res = w if w in (1, 2) else (RESULT_DRAW if d.get('finished') else RESULT_NONE)
+                archive.append(GameRecord(d['type'], d['size'], [m if m == "PASS" else tuple(m) for m in d['history']],
+                                          str(d.get('black', '')), str(d.get('white', '')), res, int(os.path.getmtime(path))))
+                n += 1
+        else:
+            d = json.load(f)
+            meta = d.get('meta', {})
+            hist = d.get('history') or d.get('move_history', []) # 兼容旧存档
+            rec = GameRecord(t_map.get(d['type'], d['type']), d['size'], [m if m == "PASS" else tuple(m) for m in hist],
+                             meta.get('black', ''), meta.get('white', ''), ts=int(os.path.getmtime(path)))
+            g = rec.to_game() # 旧存档没有结果字段, 重放一遍得到
+            rec.result = (g.winner if g.winner in (1, 2) else RESULT_DRAW) if g.game_over else RESULT_NONE
+            archive.append(rec); n += 1
+    return n
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="对局库")
+    ap.add_argument("archive", help="对局库文件, 如 games.gar")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("import", help="导入 .json 存档或 .jsonl 自对弈结果")
+    p.add_argument("inputs", nargs="+")
+    p = sub.add_parser("list", help="按条件列出对局")
+    p.add_argument("--player"); p.add_argument("--type", dest="gtype")
+    p.add_argument("--since", help="YYYY-MM-DD"); p.add_argument("--until", help="YYYY-MM-DD")
+    p.add_argument("-n", "--limit", type=int, default=20)
+    sub.add_parser("stats", help="各棋种局数")
+    a = ap.parse_args(argv)
+
+    arc = GameArchive(a.archive)
+    try:
+        if a.cmd == "import":
+            for path in a.inputs: print(f"{path}: {import_file(arc, path)} 局")
+        elif a.cmd == "list":
+            day = lambda s: time.mktime(time.strptime(s, "%Y-%m-%d")) if s else None
+            for r in arc.find(a.player, a.gtype, day(a.since), day(a.until), limit=a.limit):
+                res = {1: "黑胜", 2: "白胜", RESULT_DRAW: "和"}.get(r.result, "未完")
+                print(f"#{r.id} {time.strftime('%Y-%m-%d %H:%M', time.localtime(r.ts))} {r.gtype}{r.size} "
+                      f"{r.black or '?'} vs {r.white or '?'} {res} {len(r.moves)}手")
+        else:
+            for gtype, n in arc.db.execute("SELECT gtype, COUNT(*) FROM games GROUP BY gtype"): print(gtype, n)
+            print(f"共 {len(arc)} 局, 数据 {os.path.getsize(a.archive)} 字节")
+    finally:
+        arc.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,235 @@
-import copy
 import json
+import math
 import random
+import time
+from collections import OrderedDict
+
+from opening_book import OpeningBook
+
+try:
+    import numpy as np # 可选, 仅用于围棋数子的向量化实现
+except ImportError:
+    np = None
 
 # 常量
 EMPTY = 0
 BLACK = 1
 WHITE = 2
 
+# --- Zobrist 哈希 ---
+_ZOBRIST = {}
+
+def zobrist_keys(kind, size):
+    """(棋种, 尺寸) 对应的随机键表: keys[color][r*size+c] 与行棋方键, 固定种子保证跨进程一致"""
+    k = (kind, size)
+    if k not in _ZOBRIST:
+        rng = random.Random(f"{kind}:{size}")
+        keys = [None] + [[rng.getrandbits(64) for _ in range(size*size)] for _ in (BLACK, WHITE)]
+        _ZOBRIST[k] = (keys, rng.getrandbits(64))
+    return _ZOBRIST[k]
+
+# --- 置换表 ---
+TT_EXACT, TT_LOWER, TT_UPPER = 0, 1, 2
+
+class TTEntry:
+    def __init__(self, depth, value, flag, move):
+        self.depth = depth; self.value = value; self.flag = flag; self.move = move
+
+class TranspositionTable:
+    """定长置换表: 同一局面深度优先替换, 满了淘汰最久未用的"""
+    def __init__(self, capacity=1 << 18):
+        self.capacity = capacity
+        self.table = OrderedDict()
+        self.hits = 0; self.probes = 0
+
+    def probe(self, key):
+        self.probes += 1
+        e = self.table.get(key)
+        if e is not None:
+            self.hits += 1; self.table.move_to_end(key)
+        return e
+
+    def store(self, key, depth, value, flag=TT_EXACT, move=None):
+        e = self.table.get(key)
+        if e is not None:
+            if depth >= e.depth:
+                e.depth = depth; e.value = value; e.flag = flag
+                if move is not None: e.move = move
+            self.table.move_to_end(key)
+            return
+        if len(self.table) >= self.capacity: self.table.popitem(last=False)
+        self.table[key] = TTEntry(depth, value, flag, move)
+
+    def clear(self):
+        self.table.clear(); self.hits = 0; self.probes = 0
+
+    def __len__(self): return len(self.table)
+
+SHARED_TT = TranspositionTable() # 各 AI 默认共用
+
 class AIFactory:
     @staticmethod
     def create_ai(game_type):
-        if game_type == 'gomoku': return GomokuAI()
-        elif game_type == 'reversi': return ReversiAI()
-        elif game_type == 'go': return GoAI()
-        return RandomAI()
+        if game_type == 'gomoku': ai = GomokuAI()
+        elif game_type == 'reversi': ai = ReversiAI()
+        elif game_type == 'go': ai = GoAI()
+        else: return RandomAI()
+        ai.book = OpeningBook.open_default(game_type) # 有 books/<棋种>.book 就先查书
+        return ai
 
 class AIInterface:
+    def __init__(self, tt=None, book=None):
+        self.tt = tt if tt is not None else SHARED_TT
+        self.book = book
     def get_move(self, game): raise NotImplementedError
+    def _book_move(self, game):
+        return self.book.best_move(game) if self.book is not None else None
 
 class RandomAI(AIInterface):
     def get_move(self, game):
         moves = game.get_valid_moves(game.current_player)
         return random.choice(moves) if moves else None
 
+DIRS4 = [(0,1), (1,0), (1,1), (1,-1)]
+
+class ThreatSearch:
+    """五子棋威胁空间搜索: 只展开先手着法. VCF 只用冲四, VCT 再加活三"""
+    def __init__(self, max_nodes=20000, time_limit=0.3, vcf_depth=12, vct_depth=5):
+        self.max_nodes = max_nodes
+        self.time_limit = time_limit
+        self.vcf_depth = vcf_depth
+        self.vct_depth = vct_depth
+        self.stats = {} # 最近一次搜索: mode, nodes, time, found
+
+    def find(self, game, color, vct=False):
+        """返回 color 的必胜首着, 没找到或超出限制返回 None"""
+        g = self.g = game.clone()
+        self.b, self.n, self.vct = g.board, g.size, vct
+        self.me, self.opp = color, (WHITE if color == BLACK else BLACK)
+        self.nodes = 0; self.failed = {}
+        start = time.time(); self.deadline = start + self.time_limit
+        self.cands = g.cands # 随 _write 增量维护
+        my_w = {p for p in self.cands if g.is_winning_move(p[0], p[1], self.me)}
+        op_w = {p for p in self.cands if g.is_winning_move(p[0], p[1], self.opp)}
+        try:
+            mv = self._attack(self.vct_depth if vct else self.vcf_depth, my_w, op_w, None)
+        except SearchTimeout:
+            mv = None
+        self.stats = {"mode": "VCT" if vct else "VCF", "nodes": self.nodes,
+                      "time": round(time.time() - start, 3), "found": mv}
+        return mv
+
+    def _tick(self):
+        self.nodes += 1
+        if self.nodes >= self.max_nodes or (self.nodes & 31 == 0 and time.time() > self.deadline):
+            raise SearchTimeout()
+
+    def _shape(self, r, c, color):
+        """color 下在 (r,c) 后: (新增的成五点集合, 成三的方向数)"""
+        b, n = self.b, self.n
+        fours = set(); threes = 0
+        for dr, dc in DIRS4:
+            line = [] # 以 (r,c) 为中心的9格, 出界记 -1
+            for k in range(-4, 5):
+                rr, cc = r + dr*k, c + dc*k
+                line.append(b[rr][cc] if 0 <= rr < n and 0 <= cc < n else -1)
+            line[4] = color
+            three = False
+            for s in range(5): # 所有包含 (r,c) 的5格窗口
+                w = line[s:s+5]
+                cnt = w.count(color)
+                if cnt + w.count(EMPTY) != 5: continue
+                if cnt == 4:
+                    k = s + w.index(EMPTY) - 4
+                    fours.add((r + dr*k, c + dc*k))
+                elif cnt == 3: three = True
+            threes += three
+        return fours, threes
+
+    def _place(self, q, color, fours, w_self, w_other):
+        """落子并返回 (新的己方成五点, 新的对方成五点)"""
+        self.g._write(q[0], q[1], color)
+        other = WHITE if color == BLACK else BLACK
+        w_self = (w_self - {q}) | fours
+        w_other = {p for p in w_other if p != q and self.g.is_winning_move(p[0], p[1], other)}
+        return w_self, w_other
+
+    def _unplace(self, q):
+        self.g._write(q[0], q[1], EMPTY)
+
+    def _attack(self, depth, my_w, op_w, threat):
+        self._tick()
+        if my_w: return next(iter(my_w))
+        if len(op_w) >= 2 or depth == 0: return None
+        key = self.g.zhash
+        if self.failed.get(key, -1) >= depth: return None
+        if op_w: # 对方有冲四, 只能先挡
+            moves = [(q, self._shape(q[0], q[1], self.me)) for q in op_w]
+        else:
+            moves = []
+            for q in self.cands:
+                fours, threes = self._shape(q[0], q[1], self.me)
+                if fours or (self.vct and threes): moves.append((q, (fours, threes)))
+            moves.sort(key=lambda m: (len(m[1][0]), m[1][1]), reverse=True) # 冲四优先, 再看成三方向数
+        for q, (fours, threes) in moves:
+            nm, no = self._place(q, self.me, fours, my_w, op_w)
+            ok = self._defend(depth - 1, nm, no, [t for t in (threat, q) if t])
+            self._unplace(q)
+            if ok: return q
+        self.failed[key] = depth
+        return None
+
+    def _defend(self, depth, my_w, op_w, threats):
+        """对方应手: 全部应法都挡不住才算成功"""
+        self._tick()
+        if op_w: return False # 对方直接成五
+        if len(my_w) >= 2: return True
+        if my_w: responses = set(my_w)
+        else:
+            if not self.vct: return False
+            # 活三的防点: 我方下了会出现两个成五点(活四)的位置
+            responses = set()
+            for tr, tc in threats:
+                for dr, dc in DIRS4:
+                    for k in range(-4, 5):
+                        q = (tr + dr*k, tc + dc*k)
+                        if 0 <= q[0] < self.n and 0 <= q[1] < self.n and self.b[q[0]][q[1]] == EMPTY \
+                                and len(self._shape(q[0], q[1], self.me)[0]) >= 2:
+                            responses.add(q)
+            if not responses: return False
+            # 对方也可以用冲四反击
+            responses |= {q for q in self.cands if self._shape(q[0], q[1], self.opp)[0]}
+        for q in responses:
+            fours = self._shape(q[0], q[1], self.opp)[0]
+            no, nm = self._place(q, self.opp, fours, op_w, my_w)
+            res = self._attack(depth, nm, no, threats[-1] if threats else None)
+            self._unplace(q)
+            if res is None: return False
+        return True
+
 class GomokuAI(AIInterface):
+    def __init__(self, tt=None, threats=None):
+        super().__init__(tt)
+        self.threats = threats or ThreatSearch()
+
     def get_move(self, game):
+        mv = self._book_move(game)
+        if mv: return mv
         if len(game.move_history) == 0:
             return (game.size // 2, game.size // 2)
 
-        candidates = self._get_neighbor_moves(game)
+        key = game.position_hash()
+        e = self.tt.probe(key)
+        if e is not None and e.move is not None: return e.move
+
+        # 先找强制胜: 连续冲四, 再到冲四活三
+        me = game.current_player
+        mv = self.threats.find(game, me) or self.threats.find(game, me, vct=True)
+        if mv:
+            self.tt.store(key, 0, WIN_SCORE, TT_EXACT, mv)
+            return mv
+
+        candidates = game.candidate_moves()
         if not candidates: return None
 
         best_score = -1
@@ -46,66 +247,18 @@ class GomokuAI(AIInterface):
                 best_score = total_score
                 best_move = (r, c)
         
+        self.tt.store(key, 0, best_score, TT_EXACT, best_move)
         return best_move
 
-    def _get_neighbor_moves(self, game):
-        """只搜索有棋子周围的空位"""
-        moves = set()
-        size = game.size
-        has_stone = False
-        for r in range(size):
-            for c in range(size):
-                if game.board[r][c] != EMPTY:
-                    has_stone = True
-                    for i in range(-2, 3):
-                        for j in range(-2, 3):
-                            if i==0 and j==0: continue
-                            nr, nc = r+i, c+j
-                            if 0<=nr<size and 0<=nc<size and game.board[nr][nc] == EMPTY:
-                                moves.add((nr, nc))
-        if not has_stone: # 空盘
-            return [(size//2, size//2)]
-        return list(moves)
-
     def _evaluate_point_power(self, game, r, c, color):
         """
         计算在 (r,c) 落子后，该点在四个方向上形成的棋型分数总和
+        (连子数与被堵情况取自 game.line_shape 的缓存)
         """
         score = 0
-        # 四个方向：横、竖、左斜、右斜
-        directions = [(1,0), (0,1), (1,1), (1,-1)]
-        
-        for dr, dc in directions:
-            # 向两个方向延伸计数
-            count = 1 
-            # 检查两端是否被堵
-            blocked_sides = 0 
-
-            # 正向延伸 (Forward)
-            i = 1
-            while True:
-                nr, nc = r + dr*i, c + dc*i
-                if not game.is_valid_coord(nr, nc): # 出界算被堵
-                    blocked_sides += 1; break
-                val = game.board[nr][nc]
-                if val == color: count += 1
-                elif val == EMPTY: break # 空位停止
-                else: # 敌方棋子，算被堵
-                    blocked_sides += 1; break
-                i += 1
-            
-            # 反向延伸 (Backward)
-            i = 1
-            while True:
-                nr, nc = r - dr*i, c - dc*i
-                if not game.is_valid_coord(nr, nc):
-                    blocked_sides += 1; break
-                val = game.board[nr][nc]
-                if val == color: count += 1
-                elif val == EMPTY: break
-                else:
-                    blocked_sides += 1; break
-                i += 1
+        center = 7 - max(abs(r-7), abs(c-7))
+        for d in range(4):
+            count, blocked_sides = game.line_shape(r, c, color, d)
 
             # --- 评分规则表 (根据连子数和被堵情况) ---
             # 连5 (赢了)
@@ -125,27 +278,145 @@ class GomokuAI(AIInterface):
                 elif blocked_sides == 1: score += 10 # 眠二
             
             # 额外加分：位置越靠中间越好
-            score += (7 - max(abs(r-7), abs(c-7)))
+            score += center
 
         return score
 
+# 权重图 (8x8)
+REVERSI_WEIGHTS = [
+    [100, -20, 10,  5,  5, 10, -20, 100],
+    [-20, -50, -2, -2, -2, -2, -50, -20],
+    [ 10,  -2, -1, -1, -1, -1,  -2,  10],
+    [  5,  -2, -1, -1, -1, -1,  -2,   5],
+    [  5,  -2, -1, -1, -1, -1,  -2,   5],
+    [ 10,  -2, -1, -1, -1, -1,  -2,  10],
+    [-20, -50, -2, -2, -2, -2, -50, -20],
+    [100, -20, 10,  5,  5, 10, -20, 100]
+]
+# 按行预计算: ROW_WEIGHT[r][byte] = 第 r 行中 byte 置位格子的权重和
+ROW_WEIGHT = [[sum(REVERSI_WEIGHTS[r][c] for c in range(8) if b >> c & 1) for b in range(256)] for r in range(8)]
+BB_CORNERS = (1 << 0) | (1 << 7) | (1 << 56) | (1 << 63)
+WIN_SCORE = 100000
+
+class SearchTimeout(Exception): pass
+
+# 四个象限, 用于残局奇偶性排序
+BB_QUADRANTS = [0x0F0F0F0F, 0xF0F0F0F0, 0x0F0F0F0F << 32, 0xF0F0F0F0 << 32]
+
+class ReversiEndgame:
+    """残局精确求解: exact 算出最终子数差, wld 只判胜/和/负 (结果为 1/0/-1)"""
+    def __init__(self, mode='exact', time_limit=5.0, tt=None):
+        self.mode = mode
+        self.time_limit = time_limit
+        self.tt = tt if tt is not None else TranspositionTable(1 << 20) # 精确值不能和中局估值混放
+        self.stats = {}
+
+    def solve(self, own, opp):
+        """返回 (最佳着法下标, 分值); 超时返回 None"""
+        start = time.time(); self.deadline = start + self.time_limit
+        self.nodes = 0
+        lo, hi = (-1, 1) if self.mode == 'wld' else (-64, 64)
+        try:
+            best, alpha = None, -65
+            for sq in self._order(own, opp, bb_moves(own, opp)):
+                f = bb_flips(own, opp, sq)
+                v = -self._solve(opp & ~f, own | f | (1 << sq), -hi, -max(alpha, lo), False)
+                if v > alpha: best, alpha = sq, v
+                if alpha >= hi: break
+        except SearchTimeout:
+            return None
+        el = time.time() - start
+        score = alpha if self.mode == 'exact' else (alpha > 0) - (alpha < 0)
+        self.stats = {"solver": self.mode, "empties": 64 - (own | opp).bit_count(), "nodes": self.nodes,
+                      "time": round(el, 3), "nps": int(self.nodes / el) if el > 0 else 0, "score": score}
+        return best, score
+
+    def _solve(self, own, opp, alpha, beta, passed):
+        self.nodes += 1
+        if self.nodes & 1023 == 0 and time.time() > self.deadline: raise SearchTimeout()
+        moves = bb_moves(own, opp)
+        if not moves:
+            if passed: # 双方都无棋: 终局, 空格归胜方
+                empties = 64 - (own | opp).bit_count()
+                diff = own.bit_count() - opp.bit_count()
+                return diff + empties if diff > 0 else (diff - empties if diff < 0 else 0)
+            return -self._solve(opp, own, -beta, -alpha, True)
+
+        key = ('end', own, opp)
+        a0 = alpha
+        e = self.tt.probe(key)
+        if e is not None:
+            if e.flag == TT_EXACT: return e.value
+            if e.flag == TT_LOWER: alpha = max(alpha, e.value)
+            else: beta = min(beta, e.value)
+            if alpha >= beta: return e.value
+
+        best, best_sq = -65, None
+        for sq in self._order(own, opp, moves):
+            f = bb_flips(own, opp, sq)
+            v = -self._solve(opp & ~f, own | f | (1 << sq), -beta, -alpha, False)
+            if v > best:
+                best, best_sq = v, sq
+                if v > alpha: alpha = v
+                if alpha >= beta: break
+        flag = TT_UPPER if best <= a0 else (TT_LOWER if best >= beta else TT_EXACT)
+        self.tt.store(key, 64, best, flag, best_sq)
+        return best
+
+    def _order(self, own, opp, moves):
+        """空格多时按对手行动力从少到多(最快优先), 空格少时先走奇数空格的象限"""
+        empty = ~(own | opp) & BB_FULL
+        if empty.bit_count() > 7:
+            def key(sq):
+                f = bb_flips(own, opp, sq)
+                k = bb_moves(opp & ~f, own | f | (1 << sq)).bit_count()
+                return k - 4 if BB_CORNERS >> sq & 1 else k
+            return sorted(bb_iter(moves), key=key)
+        odd = [sq for sq in bb_iter(moves) if any(q >> sq & 1 and (q & empty).bit_count() & 1 for q in BB_QUADRANTS)]
+        return odd + [sq for sq in bb_iter(moves) if sq not in odd]
+
 class ReversiAI(AIInterface):
+    """8x8 位棋盘上的 negamax + alpha-beta, 迭代加深, 超时返回已找到的最好着法;
+    空格不多于 endgame_empties 时改用残局求解器算到终局; 求解限时 endgame_time,
+    不给则从 time_limit 里分一半, 解不出时剩下的留给普通搜索"""
+    def __init__(self, tt=None, time_limit=0.5, max_depth=60, endgame_empties=10, endgame_mode='exact', endgame_time=None):
+        super().__init__(tt)
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.endgame_empties = endgame_empties
+        self.endgame_time = endgame_time
+        self.endgame = ReversiEndgame(endgame_mode)
+        self.stats = {} # 最近一次搜索: depth, nodes, nps, time, score (残局求解时另有 solver, empties)
+
     def get_move(self, game):
+        mv = self._book_move(game)
+        if mv: return mv
+        if not getattr(game, 'use_bitboard', False): return self._greedy_move(game)
+        me = game.current_player
+        own, opp = game.bits[me], game.bits[WHITE if me == BLACK else BLACK]
+        if not bb_moves(own, opp): return None
+        budget, failed = self.time_limit, None
+        if 64 - (own | opp).bit_count() <= self.endgame_empties:
+            t = self.endgame_time if self.endgame_time is not None else self.time_limit / 2
+            self.endgame.time_limit = t # time_limit 可能在构造后被改 (selfplay --time)
+            res = self.endgame.solve(own, opp) # 超时则退回普通搜索
+            if res is not None:
+                self.stats = self.endgame.stats
+                return (res[0] >> 3, res[0] & 7)
+            failed = {"solver": self.endgame.mode, "solver_failed": True, "solver_nodes": self.endgame.nodes, "solver_time": t}
+            if self.endgame_time is None: budget -= t
+        sq = self._search(own, opp, budget)
+        if failed: self.stats.update(failed)
+        return (sq >> 3, sq & 7)
+
+    def _greedy_move(self, game):
+        key = game.position_hash()
+        e = self.tt.probe(key)
+        if e is not None and e.move is not None: return e.move
+
         moves = game.get_valid_moves(game.current_player)
         if not moves: return None
 
-        # 权重图 (8x8)
-        WEIGHTS = [
-            [100, -20, 10,  5,  5, 10, -20, 100],
-            [-20, -50, -2, -2, -2, -2, -50, -20],
-            [ 10,  -2, -1, -1, -1, -1,  -2,  10],
-            [  5,  -2, -1, -1, -1, -1,  -2,   5],
-            [  5,  -2, -1, -1, -1, -1,  -2,   5],
-            [ 10,  -2, -1, -1, -1, -1,  -2,  10],
-            [-20, -50, -2, -2, -2, -2, -50, -20],
-            [100, -20, 10,  5,  5, 10, -20, 100]
-        ]
-        
         best_score = -99999
         best_move = moves[0]
 
@@ -153,7 +424,7 @@ class ReversiAI(AIInterface):
             # 贪婪评估：只看这一步带来的位置分 + 翻转数量
             # 1. 位置分
             pos_score = 0
-            if game.size == 8: pos_score = WEIGHTS[r][c]
+            if game.size == 8: pos_score = REVERSI_WEIGHTS[r][c]
             else: pos_score = 10 # 非标准棋盘随便给分
             
             # 2. 翻转数量
@@ -166,40 +437,344 @@ class ReversiAI(AIInterface):
                 best_score = score
                 best_move = (r, c)
                 
+        self.tt.store(key, 0, best_score, TT_EXACT, best_move)
         return best_move
 
+    # --- 搜索 ---
+    def _search(self, own, opp, budget=None):
+        budget = self.time_limit if budget is None else budget
+        start = time.time()
+        self.deadline = start + budget
+        self.nodes = 0
+        self.killers = [[None, None] for _ in range(64)]
+        self.history = [0] * 64
+        empties = 64 - (own | opp).bit_count()
+        best, best_score, reached = None, 0, 0
+        for depth in range(1, min(self.max_depth, empties) + 1):
+            try:
+                sq, score = self._root(own, opp, depth, best)
+            except SearchTimeout as t:
+                if t.args and t.args[0] is not None: best, best_score = t.args[0], t.args[1]
+                break
+            best, best_score, reached = sq, score, depth
+            if abs(score) >= WIN_SCORE: break # 已算清胜负
+            # 下一层通常要花数倍时间, 剩余不足一半就不再开始
+            if time.time() - start > budget / 2: break
+        if best is None: best = next(bb_iter(bb_moves(own, opp)))
+        el = time.time() - start
+        self.stats = {"depth": reached, "nodes": self.nodes, "time": round(el, 3),
+                      "nps": int(self.nodes / el) if el > 0 else 0, "score": best_score}
+        return best
+
+    def _root(self, own, opp, depth, prev_best):
+        alpha, beta = -WIN_SCORE * 2, WIN_SCORE * 2
+        best, best_score = None, alpha
+        for sq in self._order(bb_moves(own, opp), prev_best, 0):
+            f = bb_flips(own, opp, sq)
+            try:
+                v = -self._negamax(opp & ~f, own | f | (1 << sq), depth - 1, -beta, -alpha, 1)
+            except SearchTimeout:
+                raise SearchTimeout(best, best_score) # 带出本层已完整搜过的最好着法
+            if v > best_score:
+                best, best_score = sq, v
+                alpha = max(alpha, v)
+        return best, best_score
+
+    def _negamax(self, own, opp, depth, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes & 1023 == 0 and time.time() > self.deadline: raise SearchTimeout()
+        moves = bb_moves(own, opp)
+        if not moves:
+            if not bb_moves(opp, own): # 双方无棋, 终局
+                diff = own.bit_count() - opp.bit_count()
+                return (WIN_SCORE + diff) if diff > 0 else ((-WIN_SCORE + diff) if diff < 0 else 0)
+            return -self._negamax(opp, own, depth, -beta, -alpha, ply + 1) # Pass
+        if depth == 0: return self._evaluate(own, opp, moves)
+
+        key = (own, opp)
+        a0 = alpha
+        e = self.tt.probe(key)
+        tt_move = None
+        if e is not None:
+            tt_move = e.move
+            if e.depth >= depth:
+                if e.flag == TT_EXACT: return e.value
+                if e.flag == TT_LOWER: alpha = max(alpha, e.value)
+                elif e.flag == TT_UPPER: beta = min(beta, e.value)
+                if alpha >= beta: return e.value
+
+        best, best_move = -WIN_SCORE * 2, None
+        for sq in self._order(moves, tt_move, ply):
+            f = bb_flips(own, opp, sq)
+            v = -self._negamax(opp & ~f, own | f | (1 << sq), depth - 1, -beta, -alpha, ply + 1)
+            if v > best:
+                best, best_move = v, sq
+                if v > alpha: alpha = v
+                if alpha >= beta:
+                    k = self.killers[ply]
+                    if k[0] != sq: k[1] = k[0]; k[0] = sq
+                    self.history[sq] += depth * depth
+                    break
+        flag = TT_UPPER if best <= a0 else (TT_LOWER if best >= beta else TT_EXACT)
+        self.tt.store(key, depth, best, flag, best_move)
+        return best
+
+    def _order(self, moves, first, ply):
+        """置换表着法 > 角 > 杀手着法 > 历史分"""
+        killers = self.killers[ply] if ply < 64 else (None, None)
+        def key(sq):
+            if sq == first: return 1 << 30
+            if BB_CORNERS >> sq & 1: return 1 << 29
+            if sq == killers[0]: return 1 << 28
+            if sq == killers[1]: return 1 << 27
+            return self.history[sq]
+        return sorted(bb_iter(moves), key=key, reverse=True)
+
+    def _evaluate(self, own, opp, own_moves):
+        """位置分 + 行动力"""
+        score = 0
+        for r in range(8):
+            sh = r * 8
+            score += ROW_WEIGHT[r][own >> sh & 0xFF] - ROW_WEIGHT[r][opp >> sh & 0xFF]
+        return score + 5 * (own_moves.bit_count() - bb_moves(opp, own).bit_count())
+
+class MCTSNode:
+    def __init__(self, move, parent, player, untried):
+        self.move = move # 进入本节点的着法, None 表示 Pass
+        self.parent = parent
+        self.player = player # 走出 move 的一方, wins 按它计
+        self.children = {}
+        self.untried = untried
+        self.visits = 0; self.wins = 0.0
+
+    def uct_child(self, c):
+        log_n = math.log(self.visits)
+        return max(self.children.values(),
+                   key=lambda ch: ch.wins / ch.visits + c * math.sqrt(log_n / ch.visits))
+
+class GoPlayout:
+    """随机对局用的轻量棋盘: 一维数组加棋块, 不记悔棋栈、棋谱和哈希, 只防单劫 (全局同形由步数上限兜底).
+    棋子只会整块被提, 所以棋块不用拆分"""
+    def __init__(self, game):
+        n = game.size; self.size, self.komi, self.adj = n, game.komi, game.adj
+        self.board = b = [v for row in game.board for v in row]
+        self.player = game.current_player
+        self.passes = 1 if game.move_history and game.move_history[-1] == "PASS" else 0
+        self.ko = None
+        self.empties = [i for i, v in enumerate(b) if v == EMPTY]
+        self.pos = [0] * (n*n) # 空点在 empties 中的下标
+        for k, i in enumerate(self.empties): self.pos[i] = k
+        self.chain = chain = [None] * (n*n)
+        for i, v in enumerate(b): # 按连通块建棋块
+            if v == EMPTY or chain[i] is not None: continue
+            g = GoGroup(v, {i}, set()); chain[i] = g; stack = [i]
+            while stack:
+                for j in self.adj[stack.pop()]:
+                    if b[j] == EMPTY: g.libs.add(j)
+                    elif b[j] == v and chain[j] is None: chain[j] = g; g.stones.add(j); stack.append(j)
+
+    def playable(self, i, me):
+        """不是劫, 不填自己的眼, 不自杀; 有直接气的点免去查棋块"""
+        if i == self.ko: return False
+        b, adj = self.board, self.adj[i]
+        eye = True
+        for j in adj:
+            v = b[j]
+            if v == EMPTY: return True
+            if v != me: eye = False
+        if eye: return False
+        for j in adj:
+            n = len(self.chain[j].libs)
+            if (n > 1) if b[j] == me else (n == 1): return True # 接上有气的自家块, 或提子
+        return False
+
+    def random_move(self):
+        """在空点里不放回地随机抽, 抽到可下的点为止; 没有则返回 None"""
+        em, pos, me = self.empties, self.pos, self.player
+        k = len(em)
+        while k:
+            x = int(random.random() * k); i = em[x] # 比 randrange 快
+            if self.playable(i, me): return i
+            k -= 1; em[x], em[k] = em[k], i; pos[em[x]], pos[i] = x, k
+        return None
+
+    def play(self, i):
+        b, chain, adj, me = self.board, self.chain, self.adj, self.player
+        b[i] = me; self._take(i)
+        g = GoGroup(me, {i}, set()); dead = []
+        for j in adj[i]:
+            h = chain[j]
+            if h is None: g.libs.add(j); continue
+            h.libs.discard(i)
+            if h.color != me:
+                if not h.libs and h not in dead: dead.append(h)
+            elif h is not g:
+                if len(h.stones) > len(g.stones): g, h = h, g # 小块并入大块
+                for k in h.stones: chain[k] = g
+                g.stones |= h.stones; g.libs |= h.libs
+        g.libs.discard(i); chain[i] = g
+        for h in dead:
+            for k in h.stones: b[k] = EMPTY; chain[k] = None; self._give(k)
+            for k in h.stones:
+                for j in adj[k]:
+                    if chain[j] is not None: chain[j].libs.add(k)
+        single = len(dead) == 1 and len(dead[0].stones) == 1
+        self.ko = next(iter(dead[0].stones)) if single and len(g.stones) == 1 and len(g.libs) == 1 else None
+
+    def _take(self, i):
+        em, pos = self.empties, self.pos
+        last = em.pop()
+        if last != i: em[pos[i]] = last; pos[last] = pos[i]
+
+    def _give(self, i):
+        self.pos[i] = len(self.empties); self.empties.append(i)
+
+    def run(self, limit):
+        """双方随机下到连续两次 Pass 或满 limit 步, 按数子法返回胜方 (和棋为 None)"""
+        steps = 0
+        while self.passes < 2 and steps < limit:
+            i = self.random_move()
+            if i is None: self.passes += 1; self.ko = None
+            else: self.play(i); self.passes = 0
+            self.player = WHITE if self.player == BLACK else BLACK
+            steps += 1
+        b, w = area_count(self.board, self.adj)
+        w += self.komi
+        return BLACK if b > w else (WHITE if w > b else None)
+
 class GoAI(AIInterface):
+    """MCTS/UCT: 轻量随机对局 (见 GoPlayout), 连续两步之间复用搜索树.
+    根节点的候选按 _prior 排序, 先只展开 WIDEN 个, 随访问次数逐步放宽, 时间少时不至于每个点只摸一次.
+    置换表里按局面哈希存根的结果 (depth 为访问次数, value 为胜率), 树复用不上时用作新根的先验"""
+    TT_PRIOR = 20 # 先验最多折合这么多次访问
+    WIDEN = 8 # 根节点可展开 WIDEN + sqrt(访问次数) 个子节点
+
+    def __init__(self, tt=None, time_limit=1.0, playouts=None, uct_c=1.0):
+        super().__init__(tt)
+        self.time_limit = time_limit
+        self.playouts = playouts # 设定后按次数计, 否则按时间
+        self.uct_c = uct_c
+        self.root = None; self.root_hist = [] # 上次搜索的根及其棋谱
+        self.stats = {} # 最近一次搜索: playouts, pps, time, winrate, reused, width
+
     def get_move(self, game):
-        valid = game.get_valid_moves(game.current_player)
-        if not valid: return None
-        random.shuffle(valid) # 默认随机
-
-        opp = BLACK if game.current_player == WHITE else WHITE
-        for r, c in valid:
-            # 检查四周是否有对手的棋子
-            for dr, dc in [(0,1),(0,-1),(1,0),(-1,0)]:
-                nr, nc = r+dr, c+dc
-                if game.is_valid_coord(nr, nc) and game.board[nr][nc] == opp:
-                    pass
-        
-        safe_moves = []
-        for r, c in valid:
-            my_neighbors = 0
-            for dr, dc in [(0,1),(0,-1),(1,0),(-1,0)]:
-                nr, nc = r+dr, c+dc
-                if game.is_valid_coord(nr, nc) and game.board[nr][nc] == game.current_player:
-                    my_neighbors += 1
-            if my_neighbors < 4: 
-                safe_moves.append((r,c))
-        
-        return safe_moves[0] if safe_moves else valid[0]
+        mv = self._book_move(game)
+        if mv: return mv
+        sim = game.clone()
+        me = sim.current_player
+        key = sim.position_hash()
+        root, reused = self._reuse_root(sim), 0
+        if root is None:
+            root = MCTSNode(None, None, WHITE if me == BLACK else BLACK, self._candidates(sim))
+            self._seed(sim, root, self.tt.probe(key))
+        else: reused = root.visits
+        root.untried.sort(key=lambda mv: self._prior(sim, mv)) # 从末尾取, 分高的先展开
+        start = time.time(); n = 0
+        while True:
+            if self.playouts is not None:
+                if n >= self.playouts: break
+            elif time.time() - start > self.time_limit: break
+            self._iterate(sim, root); n += 1
+        el = time.time() - start
+        if not root.children: return None
+        # 访问次数相同 (预算很小时常见) 再比胜率
+        best = max(root.children.values(), key=lambda ch: (ch.visits, ch.wins / ch.visits))
+        self.root, self.root_hist = best, list(game.move_history) + [best.move or "PASS"]
+        best.parent = None
+        if best.move is not None: self.tt.store(key, best.visits, best.wins / best.visits, TT_EXACT, best.move)
+        self.stats = {"playouts": n, "pps": int(n / el) if el > 0 else 0, "time": round(el, 3),
+                      "winrate": round(best.wins / best.visits, 3), "reused": reused, "width": len(root.children)}
+        return best.move
+
+    def _seed(self, game, root, e):
+        """置换表里有这个局面时, 先展开表中的着法并记上折算的访问和胜率"""
+        if e is None or e.move not in root.untried: return
+        root.untried.remove(e.move)
+        mover = game.current_player
+        if not self._play(game, e.move): return
+        child = MCTSNode(e.move, root, mover, self._candidates(game))
+        game.undo()
+        child.visits = min(e.depth, self.TT_PRIOR); child.wins = e.value * child.visits
+        root.children[e.move] = child; root.visits += child.visits
+
+    def _reuse_root(self, game):
+        """沿着上次选定的节点走到当前局面, 走不通则丢弃旧树"""
+        node, hist, n = self.root, game.move_history, len(self.root_hist)
+        if node is None or len(hist) < n or [tuple(m) if m != "PASS" else m for m in hist[:n]] != \
+                [tuple(m) if m != "PASS" else m for m in self.root_hist]:
+            return None
+        for mv in hist[n:]:
+            mv = None if mv == "PASS" else tuple(mv)
+            node = node.children.get(mv)
+            if node is None: return None
+        node.parent = None
+        return node
+
+    def _prior(self, game, mv):
+        """根节点候选的展开顺序: 提子或长出被叫吃的块, 靠近已有棋子, 三四线; Pass 最后"""
+        if mv is None: return -1
+        r, c = mv; n = game.size
+        s = random.random() # 同分随机
+        for j in game.adj[r*n + c]:
+            g = game.group_at(j)
+            if g is not None: s += 11 if len(g.libs) == 1 else 1
+        line = min(r, c, n-1-r, n-1-c)
+        return s + (2 if line in (2, 3) else 1 if line > 3 else 0)
+
+    def _iterate(self, game, root):
+        node, depth = root, 0
+        width = self.WIDEN + int(math.sqrt(root.visits))
+        # 选择 (根节点展开数受 width 限制)
+        while node.children and (not node.untried or node is root and len(node.children) >= width):
+            node = node.uct_child(self.uct_c)
+            self._play(game, node.move); depth += 1
+        # 扩展
+        if node.untried:
+            mv = node.untried.pop() if node is root else node.untried.pop(random.randrange(len(node.untried)))
+            mover = game.current_player
+            self._play(game, mv); depth += 1
+            child = MCTSNode(mv, node, mover, self._candidates(game))
+            node.children[mv] = child; node = child
+        # 模拟
+        winner = self._playout(game)
+        for _ in range(depth): game.undo()
+        # 回传
+        while node is not None:
+            node.visits += 1
+            if winner == node.player: node.wins += 1
+            node = node.parent
+
+    def _play(self, game, mv):
+        if mv is None: game.pass_turn(); return True
+        return game.place_stone(mv[0], mv[1])[0]
 
+    def _is_eye(self, game, r, c, color):
+        b, n = game.board, game.size
+        for nr, nc in ((r+1,c),(r-1,c),(r,c+1),(r,c-1)):
+            if 0 <= nr < n and 0 <= nc < n and b[nr][nc] != color: return False
+        return True
+
+    def _candidates(self, game):
+        """树内候选: 不填自己眼位的合法点, 再加 Pass"""
+        if game.game_over: return []
+        me = game.current_player
+        moves = [(r, c) for r, c in game.get_valid_moves(me) if not self._is_eye(game, r, c, me)]
+        moves.append(None)
+        return moves
+
+    def _playout(self, game):
+        """从树叶局面复制一块轻量棋盘随机下完, 返回胜方"""
+        if game.game_over: return game.winner
+        return GoPlayout(game).run(game.size * game.size * 2)
 
-class GameState:
-    def __init__(self, board, player, history):
-        self.board = copy.deepcopy(board)
+class MoveDelta:
+    """相邻两次存档之间的差量, 悔棋/重做只需回放这些变化"""
+    def __init__(self, changes, prev_player, player, moves):
+        self.changes = changes # [(r, c, 旧值, 新值), ...] 包括落子、提子、翻转
+        self.prev_player = prev_player
         self.player = player
-        self.history = copy.deepcopy(history)
+        self.moves = moves # 本步追加的棋谱, 如 [(r,c)] 或 ["PASS"]
+        self.over = False; self.winner = None # 悔棋时连同 player 一并记下, 重做时恢复
 
 class AbstractBoardGame:
     def __init__(self, size=15):
@@ -207,24 +782,75 @@ class AbstractBoardGame:
         self.board = [[EMPTY]*size for _ in range(size)]
         self.current_player = BLACK
         self.undo_stack = []
+        self.redo_stack = []
         self.move_history = []
         self.game_over = False
         self.winner = None
-        self._save_undo()
+        self.zkeys, self.zside = zobrist_keys(self.__class__.__name__, size)
+        self.zhash = 0 # 只含棋子部分, 行棋方在 position_hash 中异或
+        self._reset_undo()
+
+    def _reset_undo(self):
+        self.undo_stack = []; self.redo_stack = []
+        self._pending = [] # 本步尚未存档的棋盘变化
+        self._mark = (self.current_player, len(self.move_history)) # 上次存档时的行棋方与棋谱长度
 
     def _save_undo(self):
-        self.undo_stack.append(GameState(self.board, self.current_player, self.move_history))
+        prev_player, n = self._mark
+        self.undo_stack.append(MoveDelta(self._pending, prev_player, self.current_player, self.move_history[n:]))
+        self.redo_stack = []
+        self._pending = []
+        self._mark = (self.current_player, len(self.move_history))
+
+    def _set(self, r, c, v):
+        """落子/提子/翻转统一走这里, 以便记录差量"""
+        self._pending.append((r, c, self.board[r][c], v))
+        self._write(r, c, v)
+
+    def _write(self, r, c, v):
+        """实际写棋盘, 子类可重写以同步派生数据"""
+        old = self.board[r][c]
+        self.board[r][c] = v
+        i = r*self.size + c
+        if old != EMPTY: self.zhash ^= self.zkeys[old][i]
+        if v != EMPTY: self.zhash ^= self.zkeys[v][i]
+
+    def position_hash(self):
+        return self.zhash ^ (self.zside if self.current_player == WHITE else 0)
 
     def undo(self):
-        if len(self.undo_stack) < 2: return False, "无棋可悔"
-        self.undo_stack.pop()
-        s = self.undo_stack[-1]
-        self.board = copy.deepcopy(s.board)
-        self.current_player = s.player
-        self.move_history = copy.deepcopy(s.history)
+        if not self.undo_stack: return False, "无棋可悔"
+        d = self.undo_stack.pop()
+        d.player, d.over, d.winner = self.current_player, self.game_over, self.winner
+        for r, c, old, new in reversed(d.changes): self._write(r, c, old)
+        if d.moves: del self.move_history[-len(d.moves):]
+        self.current_player = d.prev_player
+        self._mark = (self.current_player, len(self.move_history))
+        self.redo_stack.append(d)
         self.game_over = False; self.winner = None
         return True, "悔棋成功"
 
+    def redo(self):
+        if not self.redo_stack: return False, "无棋可重做"
+        d = self.redo_stack.pop()
+        for r, c, old, new in d.changes: self._write(r, c, new)
+        self.move_history.extend(d.moves)
+        self.current_player = d.player
+        self._mark = (self.current_player, len(self.move_history))
+        self.undo_stack.append(d)
+        self.game_over, self.winner = d.over, d.winner
+        return True, "重做成功"
+
+    def clone(self):
+        """复制当前局面(不含悔棋栈), 供 AI 模拟时随意落子"""
+        g = self.__class__(self.size)
+        g.board = [row[:] for row in self.board]
+        g.current_player = self.current_player
+        g.move_history = list(self.move_history)
+        g.game_over = self.game_over; g.winner = self.winner
+        g._rebuild_cache(); g._reset_undo()
+        return g
+
     def is_valid_coord(self, r, c):
         return 0 <= r < self.size and 0 <= c < self.size
 
@@ -246,6 +872,14 @@ class AbstractBoardGame:
     def get_valid_moves(self, player): raise NotImplementedError
     def _check_winner(self): raise NotImplementedError
     def _after_turn(self): pass
+    def _rebuild_cache(self):
+        """board 被整体替换后(读档)重建派生数据"""
+        self.zkeys, self.zside = zobrist_keys(self.__class__.__name__, self.size)
+        self.zhash = 0
+        for r in range(self.size):
+            for c in range(self.size):
+                p = self.board[r][c]
+                if p != EMPTY: self.zhash ^= self.zkeys[p][r*self.size + c]
     
     # --- 通用功能 ---
     def save_to_file(self, fpath, meta=None):
@@ -262,7 +896,8 @@ class AbstractBoardGame:
             if d['type'] != self.__class__.__name__: return False, "类型不符"
             self.size = d['size']; self.board = d['board']
             self.current_player = d['player']; self.move_history = d['history']
-            self.undo_stack = []; self._save_undo(); self._check_winner()
+            self._rebuild_cache()
+            self._reset_undo(); self._check_winner()
             return True, d.get('meta', {})
         except Exception as e: return False, str(e)
 
@@ -272,16 +907,114 @@ class AbstractBoardGame:
         return "认负"
 
 # --- 五子棋规则 ---
+_NEAR_OFFSETS = {}
+
+def near_offsets(size, radius=2):
+    """每个格子周围 radius 范围内(不含自身)的格子列表, 按 r*size+c 索引"""
+    k = (size, radius)
+    if k not in _NEAR_OFFSETS:
+        _NEAR_OFFSETS[k] = [[(r+i, c+j) for i in range(-radius, radius+1) for j in range(-radius, radius+1)
+                             if (i or j) and 0 <= r+i < size and 0 <= c+j < size]
+                            for r in range(size) for c in range(size)]
+    return _NEAR_OFFSETS[k]
+
 class GomokuGame(AbstractBoardGame):
+    def __init__(self, size=15):
+        super().__init__(size)
+        self.near = [[0]*size for _ in range(size)] # 周围两格内的棋子数
+        self.cands = set() # 候选点: near > 0 的空位
+        self._nbrs = near_offsets(size)
+        self._reset_shapes()
+
+    def _reset_shapes(self):
+        # shapes[color][d][r*size+c] = (连子数, 被堵端数), None 表示需重算
+        n2 = self.size * self.size
+        self.shapes = [None] + [[[None]*n2 for _ in DIRS4] for _ in (BLACK, WHITE)]
+
+    def line_shape(self, r, c, color, d):
+        """假设 color 下在 (r,c), 沿 DIRS4[d] 的连子数和被堵端数(出界或敌子), 带缓存"""
+        cache = self.shapes[color][d]
+        i = r*self.size + c
+        v = cache[i]
+        if v is None:
+            dr, dc = DIRS4[d]
+            n, b = self.size, self.board
+            count = 1; blocked = 0
+            for sr, sc in ((dr, dc), (-dr, -dc)):
+                nr, nc = r + sr, c + sc
+                while True:
+                    if not (0 <= nr < n and 0 <= nc < n): blocked += 1; break
+                    p = b[nr][nc]
+                    if p == color: count += 1
+                    elif p == EMPTY: break
+                    else: blocked += 1; break
+                    nr += sr; nc += sc
+            v = cache[i] = (count, blocked)
+        return v
+
+    def _invalidate_shapes(self, r, c):
+        """(r,c) 变化只影响经过它的四条线: 沿每个方向清掉相邻格, 再沿同色连子继续清"""
+        n, b = self.size, self.board
+        for d, (dr, dc) in enumerate(DIRS4):
+            for color in (BLACK, WHITE):
+                cache = self.shapes[color][d]
+                cache[r*n + c] = None
+                for sr, sc in ((dr, dc), (-dr, -dc)):
+                    nr, nc = r + sr, c + sc
+                    while 0 <= nr < n and 0 <= nc < n:
+                        cache[nr*n + nc] = None
+                        if b[nr][nc] != color: break
+                        nr += sr; nc += sc
+
     def get_valid_moves(self, player):
         return [(r,c) for r in range(self.size) for c in range(self.size) if self.board[r][c]==EMPTY]
 
+    def candidate_moves(self):
+        """已有棋子周围两格内的空位; 空盘返回天元"""
+        if self.cands: return list(self.cands)
+        return [(self.size//2, self.size//2)] if not self.move_history else []
+
+    def _write(self, r, c, v):
+        old = self.board[r][c]; super()._write(r, c, v)
+        if (old == EMPTY) == (v == EMPTY): return
+        d = 1 if old == EMPTY else -1
+        near, board, cands = self.near, self.board, self.cands
+        for nr, nc in self._nbrs[r*self.size + c]:
+            near[nr][nc] += d
+            if board[nr][nc] == EMPTY:
+                if near[nr][nc] > 0: cands.add((nr, nc))
+                else: cands.discard((nr, nc))
+        if v != EMPTY: cands.discard((r, c))
+        elif near[r][c] > 0: cands.add((r, c))
+        self._invalidate_shapes(r, c)
+
+    def _rebuild_cache(self):
+        super()._rebuild_cache()
+        n = self.size
+        self.near = [[0]*n for _ in range(n)]; self.cands = set()
+        self._nbrs = near_offsets(n)
+        self._reset_shapes()
+        for r in range(n):
+            for c in range(n):
+                if self.board[r][c] == EMPTY: continue
+                for nr, nc in self._nbrs[r*n + c]: self.near[nr][nc] += 1
+        self.cands = {(r, c) for r in range(n) for c in range(n) if self.board[r][c] == EMPTY and self.near[r][c] > 0}
+
     def _logic_place(self, r, c):
         if self.board[r][c] != EMPTY: return False, "已有子"
-        self.board[r][c] = self.current_player
+        self._set(r, c, self.current_player)
         return True, "落子"
 
     def _check_winner(self):
+        # 只检查经过最后一手的四条线
+        last = self.move_history[-1] if self.move_history else None
+        if last is None or last == "PASS": return self._check_winner_full()
+        r, c = last
+        p = self.board[r][c]
+        if p != EMPTY and self._makes_five(r, c, p):
+            self.game_over = True; self.winner = p
+
+    def _check_winner_full(self):
         for r in range(self.size):
             for c in range(self.size):
                 p = self.board[r][c]
@@ -298,26 +1031,117 @@ class GomokuGame(AbstractBoardGame):
                 return False
         return True
 
+    def _run_len(self, r, c, dr, dc, p):
+        """从 (r,c) 沿 (dr,dc) 方向连续 p 色棋子数, 不含 (r,c) 本身"""
+        n = 0; r += dr; c += dc
+        while 0 <= r < self.size and 0 <= c < self.size and self.board[r][c] == p:
+            n += 1; r += dr; c += dc
+        return n
+
+    def _makes_five(self, r, c, p):
+        for dr, dc in [(0,1), (1,0), (1,1), (1,-1)]:
+            if 1 + self._run_len(r, c, dr, dc, p) + self._run_len(r, c, -dr, -dc, p) >= 5:
+                return True
+        return False
+
+    def is_winning_move(self, r, c, player):
+        """player 在 (r,c) 落子能否直接连五, 不修改棋盘"""
+        if not self.is_valid_coord(r, c) or self.board[r][c] != EMPTY: return False
+        return self._makes_five(r, c, player)
+
+# --- 黑白棋位棋盘 (8x8, 第 r*8+c 位对应 (r,c)) ---
+BB_FULL = 0xFFFFFFFFFFFFFFFF
+BB_NOT_A = 0xFEFEFEFEFEFEFEFE # 去掉第0列, 防止向右移位时跨行
+BB_NOT_H = 0x7F7F7F7F7F7F7F7F # 去掉第7列, 防止向左移位时跨行
+# (位移量, 掩码): 正数左移, 负数右移, 对应8个方向
+BB_DIRS = [(1, BB_NOT_A), (-1, BB_NOT_H), (8, BB_FULL), (-8, BB_FULL),
+           (9, BB_NOT_A), (7, BB_NOT_H), (-7, BB_NOT_A), (-9, BB_NOT_H)]
+
+def bb_shift(x, d, mask):
+    return ((x << d) if d > 0 else (x >> -d)) & mask
+
+def bb_moves(own, opp):
+    """所有合法落点的位掩码"""
+    empty = ~(own | opp) & BB_FULL
+    moves = 0
+    for d, m in BB_DIRS:
+        t = bb_shift(own, d, m) & opp
+        for _ in range(5): t |= bb_shift(t, d, m) & opp
+        moves |= bb_shift(t, d, m) & empty
+    return moves
+
+def bb_flips(own, opp, sq):
+    """在 sq 落子会翻转的位掩码 (不检查 sq 是否为空)"""
+    flips = 0
+    for d, m in BB_DIRS:
+        f = 0; t = bb_shift(1 << sq, d, m)
+        while t & opp:
+            f |= t; t = bb_shift(t, d, m)
+        if t & own: flips |= f
+    return flips
+
+def bb_iter(x):
+    """按从低到高的顺序枚举置位的下标"""
+    while x:
+        low = x & -x
+        yield low.bit_length() - 1
+        x ^= low
+
 # --- 黑白棋规则 ---
 class ReversiGame(AbstractBoardGame):
-    def __init__(self, size=8):
+    def __init__(self, size=8, use_bitboard=True):
+        self.use_bitboard = use_bitboard and size == 8 # 位棋盘只支持标准8x8
+        self.bits = [0, 0, 0] # 按颜色索引的位棋盘, bits[EMPTY] 不用
         super().__init__(size)
         # 初始化中心4子
         m = size // 2
         self.board[m-1][m-1] = WHITE; self.board[m][m] = WHITE
         self.board[m-1][m] = BLACK; self.board[m][m-1] = BLACK
-        self.undo_stack = []; self._save_undo()
+        self._rebuild_cache()
+        self._reset_undo()
+
+    def _write(self, r, c, v):
+        old = self.board[r][c]; super()._write(r, c, v)
+        if self.use_bitboard:
+            b = 1 << (r*8 + c)
+            if old != EMPTY: self.bits[old] &= ~b
+            if v != EMPTY: self.bits[v] |= b
+
+    def _rebuild_cache(self):
+        super()._rebuild_cache()
+        if not self.use_bitboard: return
+        self.bits = [0, 0, 0]
+        for r in range(8):
+            for c in range(8):
+                p = self.board[r][c]
+                if p != EMPTY: self.bits[p] |= 1 << (r*8 + c)
 
     def get_valid_moves(self, player):
+        if self.use_bitboard:
+            opp = WHITE if player == BLACK else BLACK
+            return [(sq >> 3, sq & 7) for sq in bb_iter(bb_moves(self.bits[player], self.bits[opp]))]
         valid = []
         for r in range(self.size):
             for c in range(self.size):
                 if self._can_flip(r, c, player) > 0: valid.append((r,c))
         return valid
 
+    def _has_moves(self, player):
+        if self.use_bitboard:
+            opp = WHITE if player == BLACK else BLACK
+            return bb_moves(self.bits[player], self.bits[opp]) != 0
+        return bool(self.get_valid_moves(player))
+
     def _can_flip(self, r, c, player, execute=False):
         if self.board[r][c] != EMPTY: return 0
         opp = WHITE if player == BLACK else BLACK
+        if self.use_bitboard:
+            sq = r*8 + c
+            f = bb_flips(self.bits[player], self.bits[opp], sq)
+            if execute and f:
+                for s in bb_iter(f): self._set(s >> 3, s & 7, player)
+                self._set(r, c, player)
+            return f.bit_count()
         flipped = 0
         
         for dr, dc in [(0,1),(0,-1),(1,0),(-1,0),(1,1),(1,-1),(-1,1),(-1,-1)]:
@@ -331,9 +1155,9 @@ class ReversiGame(AbstractBoardGame):
             if path and self.is_valid_coord(cx, cy) and self.board[cx][cy] == player:
                 flipped += len(path)
                 if execute:
-                    for fx, fy in path: self.board[fx][fy] = player
+                    for fx, fy in path: self._set(fx, fy, player)
         
-        if execute and flipped > 0: self.board[r][c] = player
+        if execute and flipped > 0: self._set(r, c, player)
         return flipped
 
     def _logic_place(self, r, c):
@@ -344,64 +1168,258 @@ class ReversiGame(AbstractBoardGame):
     def _after_turn(self):
         # 检查下家是否有棋，无则跳过
         nxt = self.current_player
-        if not self.get_valid_moves(nxt):
+        if not self._has_moves(nxt):
             self.current_player = WHITE if nxt == BLACK else BLACK # 换回原玩家
-            if not self.get_valid_moves(self.current_player):
+            if not self._has_moves(self.current_player):
                 self.game_over = True; self._check_winner() # 双方无棋
             else:
                 self.move_history.append("PASS"); self._save_undo() # Pass
 
     def _check_winner(self):
-        b = sum(row.count(BLACK) for row in self.board)
-        w = sum(row.count(WHITE) for row in self.board)
+        if self.use_bitboard:
+            b = self.bits[BLACK].bit_count(); w = self.bits[WHITE].bit_count()
+        else:
+            b = sum(row.count(BLACK) for row in self.board)
+            w = sum(row.count(WHITE) for row in self.board)
         if b > w: self.winner = BLACK
         elif w > b: self.winner = WHITE
         else: self.winner = None
 
 # --- 围棋规则 (简化版) ---
+_ADJ = {}
+
+def adj_table(size):
+    """每个点上下左右的相邻点下标, 按 r*size+c 索引"""
+    if size not in _ADJ:
+        _ADJ[size] = [[(r+dr)*size + (c+dc) for dr, dc in ((0,1),(0,-1),(1,0),(-1,0))
+                       if 0 <= r+dr < size and 0 <= c+dc < size]
+                      for r in range(size) for c in range(size)]
+    return _ADJ[size]
+
+def area_count(flat, adj):
+    """一维棋盘上的 Tromp-Taylor 数子 (不含贴目): 棋子 + 只被一方围住的空域, 返回 (黑, 白)"""
+    seen = [False] * len(flat)
+    score = [0, 0, 0]
+    for i, v in enumerate(flat):
+        if v != EMPTY: score[v] += 1; continue
+        if seen[i]: continue
+        # 单次遍历整块空域, 同时记下边界颜色 (黑|白 == 3 表示双方都接触)
+        seen[i] = True; stack = [i]; cnt = 0; border = 0
+        while stack:
+            k = stack.pop(); cnt += 1
+            for j in adj[k]:
+                w = flat[j]
+                if w != EMPTY: border |= w
+                elif not seen[j]: seen[j] = True; stack.append(j)
+        if border == BLACK or border == WHITE: score[border] += cnt
+    return score[BLACK], score[WHITE]
+
+class GoGroup:
+    def __init__(self, color, stones, libs):
+        self.color = color
+        self.stones = stones # 棋子下标集合
+        self.libs = libs # 气的下标集合
+        self.dirty = False # 有子被拿走后可能已断开, 用到时再拆分
+
 class GoGame(AbstractBoardGame):
+    def __init__(self, size=15, komi=7.5):
+        self.komi = komi
+        super().__init__(size)
+        self.adj = adj_table(size)
+        self.chain = [None] * (size*size) # 每个点所属的棋块
+
     def get_valid_moves(self, player):
-        # 允许下在任何空位
-        return [(r,c) for r in range(self.size) for c in range(self.size) if self.board[r][c]==EMPTY]
+        # 空点中去掉自杀和全局同形
+        n, b = self.size, self.board
+        return [(r,c) for r in range(n) for c in range(n) if b[r][c]==EMPTY and self._legal_empty(r, c, player)]
+
+    def is_legal(self, r, c, player):
+        return self.is_valid_coord(r, c) and self.board[r][c] == EMPTY and self._legal_empty(r, c, player)
+
+    def _legal_empty(self, r, c, player):
+        if self.is_suicide(r, c, player): return False
+        return self._hash_after(r, c, player) not in self._seen
+
+    def _hash_after(self, r, c, player):
+        """在 (r,c) 落子并提子后的棋子哈希, 不改动棋盘"""
+        i = r*self.size + c
+        h = self.zhash ^ self.zkeys[player][i]
+        done = []
+        for j in self.adj[i]:
+            g = self.group_at(j)
+            if g is not None and g.color != player and len(g.libs) == 1 and g not in done:
+                done.append(g)
+                for k in g.stones: h ^= self.zkeys[g.color][k]
+        return h
 
     def _logic_place(self, r, c):
         if self.board[r][c] != EMPTY: return False, "有子"
-        self.board[r][c] = self.current_player
+        if self.is_suicide(r, c, self.current_player): return False, "禁止自杀"
+        if self._hash_after(r, c, self.current_player) in self._seen: return False, "全局同形"
+        self._set(r, c, self.current_player)
         # 提子逻辑
         opp = WHITE if self.current_player == BLACK else BLACK
         self._capture_dead(r, c, opp)
         return True, "落子"
 
     def _capture_dead(self, r, c, opp_color):
-        # 检查落子点四周的敌子，如果气为0则提走
-        for dr, dc in [(0,1),(0,-1),(1,0),(-1,0)]:
-            nr, nc = r+dr, c+dc
-            if self.is_valid_coord(nr, nc) and self.board[nr][nc] == opp_color:
-                group, liberties = self._get_group_libs(nr, nc, opp_color)
-                if liberties == 0:
-                    for gr, gc in group: self.board[gr][gc] = EMPTY
+        # 检查落子点四周的敌块，如果气为0则提走
+        n = self.size
+        for j in self.adj[r*n + c]:
+            g = self.group_at(j)
+            if g is not None and g.color == opp_color and not g.libs:
+                for k in list(g.stones): self._set(k // n, k % n, EMPTY)
+
+    # --- 全局同形: 记录出现过的棋子哈希, 随悔棋/重做增减 ---
+    def _see(self, h, d):
+        n = self._seen.get(h, 0) + d
+        if n > 0: self._seen[h] = n
+        else: self._seen.pop(h, None)
+
+    def _reset_undo(self):
+        super()._reset_undo()
+        self._seen = {self.zhash: 1}
+
+    def _save_undo(self):
+        super()._save_undo(); self._see(self.zhash, 1)
+
+    def undo(self):
+        h = self.zhash
+        ok, msg = super().undo()
+        if ok: self._see(h, -1)
+        return ok, msg
+
+    def redo(self):
+        ok, msg = super().redo()
+        if ok: self._see(self.zhash, 1)
+        return ok, msg
+
+    def clone(self):
+        g = super().clone()
+        g.komi = self.komi
+        g._seen = dict(self._seen)
+        return g
+
+    # --- 棋块与气的增量维护 ---
+    def _write(self, r, c, v):
+        old = self.board[r][c]; super()._write(r, c, v)
+        if old == v: return
+        i = r*self.size + c
+        if old != EMPTY: self._remove_stone(i)
+        if v != EMPTY: self._add_stone(i, v)
+
+    def _add_stone(self, i, color):
+        g = GoGroup(color, {i}, set())
+        for j in self.adj[i]:
+            h = self.group_at(j)
+            if h is None: g.libs.add(j); continue
+            h.libs.discard(i)
+            if h.color == color and h is not g:
+                if len(h.stones) > len(g.stones): g, h = h, g # 小块并入大块
+                for k in h.stones: self.chain[k] = g
+                g.stones |= h.stones; g.libs |= h.libs
+        g.libs.discard(i)
+        self.chain[i] = g
+
+    def _remove_stone(self, i):
+        g = self.chain[i]; self.chain[i] = None
+        g.stones.discard(i); g.libs.clear(); g.dirty = True
+        for j in self.adj[i]:
+            h = self.chain[j]
+            if h is not None and h is not g: h.libs.add(i)
+
+    def group_at(self, i):
+        """下标 i 处棋子所在的棋块(空点返回 None), 需要时先拆分"""
+        g = self.chain[i]
+        if g is not None and g.dirty: self._split(g); g = self.chain[i]
+        return g
+
+    def _split(self, g):
+        """重新划分被拿走过棋子的棋块, 并重算各块的气"""
+        left = set(g.stones)
+        while left:
+            seed = left.pop()
+            comp = {seed}; stack = [seed]; libs = set()
+            while stack:
+                k = stack.pop()
+                for j in self.adj[k]:
+                    h = self.chain[j]
+                    if h is None: libs.add(j)
+                    elif h is g and j not in comp:
+                        comp.add(j); stack.append(j)
+            left -= comp
+            ng = GoGroup(g.color, comp, libs)
+            for k in comp: self.chain[k] = ng
+
+    def _rebuild_cache(self):
+        super()._rebuild_cache()
+        n = self.size
+        self.adj = adj_table(n)
+        self.chain = [None] * (n*n)
+        for r in range(n):
+            for c in range(n):
+                if self.board[r][c] != EMPTY: self._add_stone(r*n + c, self.board[r][c])
+
+    def liberties(self, r, c):
+        g = self.group_at(r*self.size + c)
+        return len(g.libs) if g else 0
+
+    def in_atari(self, r, c):
+        return self.liberties(r, c) == 1
+
+    def is_suicide(self, r, c, color):
+        """在空点 (r,c) 落子后既无气又提不了子"""
+        for j in self.adj[r*self.size + c]:
+            g = self.group_at(j)
+            if g is None: return False
+            if g.color == color:
+                if len(g.libs) > 1: return False
+            elif len(g.libs) == 1: return False
+        return True
 
     def _get_group_libs(self, r, c, color):
-        group = set(); stack = [(r,c)]; libs = 0; visited = set()
-        while stack:
-            cx, cy = stack.pop()
-            if (cx, cy) in group: continue
-            group.add((cx, cy))
-            for dr, dc in [(0,1),(0,-1),(1,0),(-1,0)]:
-                nx, ny = cx+dr, cy+dc
-                if not self.is_valid_coord(nx, ny): continue
-                if self.board[nx][ny] == EMPTY:
-                    if (nx, ny) not in visited: libs+=1; visited.add((nx,ny))
-                elif self.board[nx][ny] == color:
-                    stack.append((nx, ny))
-        return group, libs
+        g = self.group_at(r*self.size + c)
+        if g is None or g.color != color: return set(), 0
+        n = self.size
+        return {(k // n, k % n) for k in g.stones}, len(g.libs)
 
     def pass_turn(self):
+        if self.game_over: return
         self.move_history.append("PASS")
         self.current_player = WHITE if self.current_player == BLACK else BLACK
         self._save_undo()
+        self._check_winner()
 
-    def _check_winner(self): pass # 围棋数子太复杂，暂不自动判胜负
+    def _check_winner(self):
+        # 双方连续 Pass 即终局, 按数子法判胜负
+        h = self.move_history
+        if len(h) >= 2 and h[-1] == "PASS" and h[-2] == "PASS":
+            b, w = self.area_score()
+            self.game_over = True
+            self.winner = BLACK if b > w else (WHITE if w > b else None)
+
+    def area_score(self, use_numpy=False):
+        """Tromp-Taylor 数子: 棋子 + 只被一方围住的空域, 返回 (黑, 白+贴目)"""
+        if use_numpy and np is not None: return self._area_score_numpy()
+        b, w = area_count([v for row in self.board for v in row], self.adj)
+        return b, w + self.komi
+
+    def _area_score_numpy(self):
+        b = np.array(self.board, dtype=np.int8)
+        empty = b == EMPTY
+        def reach(color):
+            # 从 color 的棋子出发, 沿空点膨胀到不动为止
+            own = b == color; m = own
+            while True:
+                g = m.copy()
+                g[1:] |= m[:-1]; g[:-1] |= m[1:]; g[:, 1:] |= m[:, :-1]; g[:, :-1] |= m[:, 1:]
+                g &= empty | own
+                if (g == m).all(): return m
+                m = g
+        rb, rw = reach(BLACK), reach(WHITE)
+        black = int((b == BLACK).sum() + (empty & rb & ~rw).sum())
+        white = int((b == WHITE).sum() + (empty & rw & ~rb).sum())
+        return black, white + self.komi
 
 class GameFactory:
     @staticmethod
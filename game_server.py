@@ -0,0 +1,416 @@
+import argparse
+import asyncio
+import itertools
+import secrets
+import time
+from collections import deque
+
+from game_core import GameFactory, BLACK, WHITE
+from network_mgr import DEFAULT_PORT, ENCODINGS, GAME_ACTIONS, FrameDecoder, encode_frame
+from ratings import DEFAULT_RATING
+
+# 协议 (帧格式同 network_mgr):
+#   客户端 -> 服务端: HELLO{name,pwd} LIST CREATE{gtype,size,color} JOIN{room} QUEUE{gtype,size}
+#                     MOVE{r,c} PASS UNDO SURRENDER LEAVE BYE ENC{encoding} WATCH{room} RESUME{token,recvd}
+#   服务端 -> 客户端: WELCOME ROOMS{rooms} JOINED{room,color} QUEUED START{...,your_color,encodings,token}
+#                     MOVE PASS UNDO SURRENDER GAME_OVER{winner,reason} ERROR{msg}
+#                     RESUMED{recvd,moves} OPP_OFFLINE OPP_ONLINE
+#   服务端 -> 观战者: SNAPSHOT{seq,board,history,...} 之后逐手 DELTA{seq,op,r,c}, 最后 GAME_OVER
+# START 的格式和 NetworkManager 主机发的一致, 客户端回 ENC 即完成编码协商
+GAME_TYPES = ('gomoku', 'reversi', 'go')
+SPECTATOR_QUEUE = 64 # 每个观战者最多积压的帧数, 超出则丢弃积压改发快照
+RESYNC = object() # 队列里的快照占位
+RECONNECT_GRACE = 60 # 对局中掉线保留座位的秒数, 超时判负
+MATCH_WINDOW = 32 # 匹配时在队首这么多人里挑分数最接近的
+
+class ClientSession:
+    def __init__(self, writer):
+        self.writer = writer
+        self.name = "游客"
+        self.auth = False # HELLO 带了正确密码, 对局计入等级分
+        self.rating = DEFAULT_RATING
+        self.encoding = "json"
+        self.room = None
+        self.color = None
+        self.watching = None # 观战时为 Spectator
+
+    def send(self, msg):
+        """只写入发送缓冲, 不等待; 对端过慢时由 transport 缓冲"""
+        if not self.writer.is_closing(): self.writer.write(encode_frame(msg, self.encoding))
+
+class Room:
+    def __init__(self, rid, gtype, size):
+        self.id = rid
+        self.gtype, self.size = gtype, size
+        self.game = GameFactory.create_game(gtype, size) # 服务端持有权威棋局
+        self.players = {} # 颜色 -> ClientSession
+        self.status = "waiting" # waiting, playing, over
+        self.seq = 0 # 已广播的增量序号, 即 log 长度
+        self.log = [] # 本局动作 [(走的一方, 动作)], 重连时只补发对方的、客户端还没收到的部分
+        self.undone = False # 有人悔过棋
+        self.recvd = {BLACK: 0, WHITE: 0} # 各方发来的对局动作数 (含被拒的), 重连时告诉客户端从哪里重发
+        self.tokens = {} # 颜色 -> 会话令牌
+        self.timers = {} # 颜色 -> 掉线判负的定时器
+        self.spectators = set()
+
+    def info(self):
+        return {"room": self.id, "gtype": self.gtype, "size": self.size, "status": self.status,
+                "players": {c: s.name for c, s in self.players.items()}}
+
+    def opponent(self, color):
+        return self.players.get(WHITE if color == BLACK else BLACK)
+
+    def snapshot(self):
+        g = self.game
+        return {"type": "SNAPSHOT", "room": self.id, "seq": self.seq, "gtype": self.gtype, "size": self.size,
+                "board": "".join(str(v) for row in g.board for v in row), "current_player": g.current_player,
+                "history": [list(m) if m != "PASS" else m for m in g.move_history],
+                "players": {c: s.name for c, s in self.players.items()}}
+
+    def sent_to(self, color):
+        """转发给 color 一方的动作, 即对方走的那些"""
+        return [a for c, a in self.log if c != color]
+
+    def broadcast(self, action, color):
+        """记入日志并把这一步推给所有观战者: 只编码一次, 只入队不等待, 不会拖慢对局双方"""
+        self.log.append((color, action))
+        self.seq += 1
+        if not self.spectators: return
+        frame = encode_frame(dict(action, type="DELTA", op=action["type"], seq=self.seq))
+        for sp in self.spectators: sp.push(self.seq, frame)
+
+class Spectator:
+    """一个观战连接: 有界队列 + 独立发送协程; 跟不上时清空积压, 改发一次最新快照"""
+    def __init__(self, session, room, maxlen=SPECTATOR_QUEUE):
+        self.session, self.room = session, room
+        self.q = asyncio.Queue(maxlen)
+        self.resyncs = 0
+        self.q.put_nowait(RESYNC) # 第一帧就是快照
+        self.task = asyncio.ensure_future(self._pump())
+
+    def push(self, seq, frame):
+        if self.q.full():
+            while not self.q.empty(): self.q.get_nowait()
+            self.q.put_nowait(RESYNC); self.resyncs += 1
+        else: self.q.put_nowait((seq, frame))
+
+    def close(self, frame):
+        """对局结束: 发完 frame (GAME_OVER) 后退出; 放不下时丢掉积压, 先补一次快照"""
+        if self.q.qsize() + 2 > self.q.maxsize:
+            while not self.q.empty(): self.q.get_nowait()
+            self.q.put_nowait(RESYNC); self.resyncs += 1
+        self.q.put_nowait((self.room.seq + 1, frame))
+        self.q.put_nowait(None)
+
+    async def _pump(self):
+        w = self.session.writer
+        last = -1 # 已发快照的序号, 更早的增量不再发
+        try:
+            while True:
+                item = await self.q.get()
+                if item is None: break
+                if item is RESYNC:
+                    snap = self.room.snapshot(); last = snap["seq"]
+                    w.write(encode_frame(snap))
+                else:
+                    seq, frame = item
+                    if seq <= last: continue
+                    w.write(frame)
+                await w.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+class GameServer:
+    """单进程 asyncio 对战服务器: 大厅、匹配、房间, 落子由 GameFactory 创建的棋局校验"""
+    def __init__(self, users=None, archive=None):
+        self.users = users # UserManager, 有则校验登录、按等级分匹配并在终局时计分
+        self.archive = archive # GameArchive, 有则终局时把对局追加进对局库
+        self.rooms = {}
+        self.tokens = {} # 会话令牌 -> (房间, 颜色)
+        self.queues = {} # (gtype, size) -> 等待匹配的 ClientSession
+        self.sessions = set()
+        self._ids = itertools.count(1)
+        self.stats = {"connections": 0, "started": 0, "finished": 0, "moves": 0, "rejected": 0, "resyncs": 0}
+
+    async def serve(self, host='0.0.0.0', port=DEFAULT_PORT):
+        server = await asyncio.start_server(self.handle_client, host, port, backlog=4096)
+        async with server: await server.serve_forever()
+
+    async def handle_client(self, reader, writer):
+        s = ClientSession(writer)
+        self.sessions.add(s); self.stats["connections"] += 1
+        decoder = FrameDecoder()
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data: break
+                try: msgs = decoder.feed(data)
+                except ValueError as e: # 帧长度超限, 流已无法对齐, 回 ERROR 后断开
+                    s.send({"type": "ERROR", "msg": str(e)}); break
+                for msg in msgs: self.dispatch(s, msg)
+                for err in decoder.errors: s.send({"type": "ERROR", "msg": err}) # 坏帧已跳过, 连接照常
+                decoder.errors.clear()
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.leave(s, "断线")
+            self.sessions.discard(s)
+            writer.close()
+
+    def dispatch(self, s, msg):
+        """处理一条消息; 格式不对或处理出错只回 ERROR, 不断开连接"""
+        if not isinstance(msg, dict): s.send({"type": "ERROR", "msg": "消息格式错误"}); return
+        try: self._dispatch(s, msg)
+        except Exception as e: s.send({"type": "ERROR", "msg": f"消息处理失败: {type(e).__name__}"})
+
+    def _dispatch(self, s, msg):
+        t = msg.get("type")
+        if t in GAME_ACTIONS and s.room and s.room.status == "playing": s.room.recvd[s.color] += 1
+        if t == "MOVE": self.on_move(s, msg)
+        elif t == "ENC":
+            if msg.get("encoding") in ENCODINGS: s.encoding = msg["encoding"]
+        elif t == "HELLO":
+            s.name = str(msg.get("name") or s.name)[:32]
+            s.auth = bool(self.users and msg.get("pwd") and self.users.check(s.name, str(msg["pwd"])))
+            s.send({"type": "WELCOME", "name": s.name, "auth": s.auth})
+        elif t == "LIST": s.send({"type": "ROOMS", "rooms": [r.info() for r in self.rooms.values() if r.status == "waiting"]})
+        elif t == "CREATE": self.on_create(s, msg)
+        elif t == "JOIN": self.on_join(s, msg)
+        elif t == "QUEUE": self.on_queue(s, msg)
+        elif t in ("PASS", "UNDO", "SURRENDER"): self.on_action(s, t)
+        elif t in ("LEAVE", "BYE"): self.leave(s, "离开")
+        elif t == "WATCH": self.on_watch(s, msg)
+        elif t == "RESUME": self.on_resume(s, msg)
+        else: s.send({"type": "ERROR", "msg": f"未知消息: {t}"})
+
+    # --- 大厅 ---
+    def _check_cfg(self, s, msg):
+        gtype, size = msg.get("gtype"), msg.get("size", 15)
+        if gtype == 'reversi': size = 8
+        if gtype not in GAME_TYPES or not isinstance(size, int) or not 5 <= size <= 19:
+            s.send({"type": "ERROR", "msg": "棋种或尺寸无效"}); return None
+        if s.room: s.send({"type": "ERROR", "msg": "已在房间中"}); return None
+        return gtype, size
+
+    def _new_room(self, gtype, size):
+        r = Room(next(self._ids), gtype, size)
+        self.rooms[r.id] = r
+        return r
+
+    def _seat(self, s, room, color):
+        room.players[color] = s
+        s.room, s.color = room, color
+        s.send({"type": "JOINED", "room": room.id, "color": color})
+
+    def on_create(self, s, msg):
+        cfg = self._check_cfg(s, msg)
+        if not cfg: return
+        color = msg.get("color", BLACK)
+        self._seat(s, self._new_room(*cfg), color if color in (BLACK, WHITE) else BLACK)
+
+    def _room(self, msg):
+        """按消息里的房间号取房间, 房间号须为整数"""
+        rid = msg.get("room")
+        return self.rooms.get(rid) if type(rid) is int else None
+
+    def on_join(self, s, msg):
+        room = self._room(msg)
+        if s.room: s.send({"type": "ERROR", "msg": "已在房间中"}); return
+        if not room or room.status != "waiting": s.send({"type": "ERROR", "msg": "房间不存在或已开始"}); return
+        self._seat(s, room, WHITE if BLACK in room.players else BLACK)
+        self.start(room)
+
+    def on_queue(self, s, msg):
+        cfg = self._check_cfg(s, msg)
+        if not cfg: return
+        q = self.queues.setdefault(cfg, deque())
+        if s in q: return
+        s.rating = self.users.rating(s.name, cfg[0]) if s.auth else DEFAULT_RATING
+        if not q:
+            q.append(s); s.send({"type": "QUEUED", "gtype": cfg[0], "size": cfg[1], "rating": s.rating}); return
+        # 队首 MATCH_WINDOW 人里挑分数最接近的, 等得久的优先
+        i = min(range(min(len(q), MATCH_WINDOW)), key=lambda j: abs(q[j].rating - s.rating))
+        other = q[i]; del q[i]
+        room = self._new_room(*cfg)
+        self._seat(other, room, BLACK); self._seat(s, room, WHITE)
+        self.start(room)
+
+    def start(self, room):
+        room.status = "playing"; self.stats["started"] += 1
+        for color, p in room.players.items():
+            opp = room.opponent(color)
+            token = room.tokens[color] = secrets.token_hex(8)
+            self.tokens[token] = (room, color)
+            p.send({"type": "START", "gtype": room.gtype, "size": room.size, "your_color": color,
+                    "host_name": opp.name if opp else "", "room": room.id, "encodings": ENCODINGS, "token": token})
+
+    # --- 对局 ---
+    def _playing(self, s):
+        room = s.room
+        if not room or room.status != "playing":
+            s.send({"type": "ERROR", "msg": "不在对局中"}); return None
+        return room
+
+    def on_move(self, s, msg):
+        room = self._playing(s)
+        if not room: return
+        g = room.game
+        r, c = msg.get("r"), msg.get("c")
+        if type(r) is not int or type(c) is not int:
+            self.stats["rejected"] += 1
+            s.send({"type": "ERROR", "msg": "坐标无效"}); return
+        if g.current_player != s.color:
+            self.stats["rejected"] += 1
+            s.send({"type": "ERROR", "msg": "还没轮到你"}); return
+        suc, info = g.place_stone(r, c)
+        if not suc:
+            self.stats["rejected"] += 1
+            s.send({"type": "ERROR", "msg": info}); return
+        self.stats["moves"] += 1
+        room.opponent(s.color).send({"type": "MOVE", "r": r, "c": c})
+        room.broadcast({"type": "MOVE", "r": r, "c": c}, s.color)
+        if g.game_over: self.finish(room, g.winner, "终局")
+
+    def on_action(self, s, t):
+        room = self._playing(s)
+        if not room: return
+        g = room.game
+        if t == "PASS":
+            if not hasattr(g, 'pass_turn') or g.current_player != s.color:
+                s.send({"type": "ERROR", "msg": "不能 Pass"}); return
+            g.pass_turn()
+        elif t == "UNDO": # 只能悔自己刚下的一手 (轮到对方时); 悔过棋的对局不计等级分
+            if g.current_player == s.color or not g.move_history:
+                s.send({"type": "ERROR", "msg": "只能悔自己刚下的一手"}); return
+            suc, info = g.undo()
+            if not suc: s.send({"type": "ERROR", "msg": info}); return
+            room.undone = True
+        room.opponent(s.color).send({"type": t})
+        if t != "SURRENDER": room.broadcast({"type": t}, s.color)
+        if t == "SURRENDER": self.finish(room, WHITE if s.color == BLACK else BLACK, "认负")
+        elif g.game_over: self.finish(room, g.winner, "终局")
+
+    def finish(self, room, winner, reason):
+        room.status = "over"; self.stats["finished"] += 1
+        b, w = room.players.get(BLACK), room.players.get(WHITE)
+        if self.users and b and w and b.auth and w.auth and not room.undone:
+            self.users.record_game(room.gtype, b.name, w.name, 1 if winner == BLACK else (0 if winner == WHITE else 0.5))
+        room.game.game_over, room.game.winner = True, winner
+        if self.archive is not None and room.game.move_history:
+            self.archive.append_game(room.game, room.gtype, b.name if b else "", w.name if w else "")
+        over = {"type": "GAME_OVER", "winner": winner, "reason": reason}
+        for p in room.players.values():
+            p.send(over)
+            p.room = p.color = None
+        for token in room.tokens.values(): self.tokens.pop(token, None)
+        for h in room.timers.values(): h.cancel()
+        room.timers.clear()
+        self._close_spectators(room, over)
+        self.rooms.pop(room.id, None)
+
+    def _close_spectators(self, room, over):
+        """房间关闭时给观战者发完 over 再断开"""
+        frame = encode_frame(over)
+        for sp in room.spectators:
+            self.stats["resyncs"] += sp.resyncs
+            sp.close(frame); sp.session.watching = None
+        room.spectators.clear()
+
+    def on_watch(self, s, msg):
+        room = self._room(msg)
+        if s.room or s.watching: s.send({"type": "ERROR", "msg": "已在房间中"}); return
+        if not room: s.send({"type": "ERROR", "msg": "房间不存在"}); return
+        s.watching = Spectator(s, room)
+        room.spectators.add(s.watching)
+
+    def on_resume(self, s, msg):
+        """凭令牌回到对局: 按客户端收到的对方动作数补发, 并告诉它服务端收到了它几个动作, 其余由它重发"""
+        token = msg.get("token")
+        room, color = self.tokens.get(token, (None, None)) if isinstance(token, str) else (None, None)
+        if not room or room.status != "playing": s.send({"type": "ERROR", "msg": "会话已失效"}); return
+        if s.room or s.watching: s.send({"type": "ERROR", "msg": "已在房间中"}); return
+        old = room.players.get(color)
+        if old is not None and old is not s:
+            s.name, s.auth, s.rating = old.name, old.auth, old.rating # 令牌即身份, 计分和存档仍按原玩家
+            old.room = old.color = None
+            old.writer.close() # 旧连接可能还没发现断开
+        h = room.timers.pop(color, None)
+        if h: h.cancel()
+        room.players[color] = s
+        s.room, s.color = room, color
+        sent = room.sent_to(color)
+        acked = msg.get("recvd", 0)
+        missing = sent[acked:] if isinstance(acked, int) and 0 <= acked <= len(sent) else []
+        s.send({"type": "RESUMED", "room": room.id, "gtype": room.gtype, "size": room.size, "your_color": color,
+                "recvd": room.recvd[color], "moves": missing, "encodings": ENCODINGS})
+        opp = room.opponent(color)
+        if opp: opp.send({"type": "OPP_ONLINE"})
+
+    def _timeout(self, room, color):
+        room.timers.pop(color, None)
+        if room.status == "playing": self.finish(room, WHITE if color == BLACK else BLACK, "掉线超时")
+
+    def leave(self, s, reason):
+        """离开房间或匹配队列; 对局中主动离开判负, 断线则保留座位等待重连"""
+        for q in self.queues.values():
+            if s in q: q.remove(s)
+        if s.watching:
+            sp, s.watching = s.watching, None
+            sp.room.spectators.discard(sp); self.stats["resyncs"] += sp.resyncs
+            sp.task.cancel()
+        room = s.room
+        if not room: return
+        if room.status == "playing" and reason == "断线" and RECONNECT_GRACE > 0:
+            loop = asyncio.get_running_loop()
+            room.timers[s.color] = loop.call_later(RECONNECT_GRACE, self._timeout, room, s.color)
+            opp = room.opponent(s.color)
+            if opp: opp.send({"type": "OPP_OFFLINE"})
+            s.room = s.color = None
+        elif room.status == "playing":
+            self.finish(room, WHITE if s.color == BLACK else BLACK, reason)
+        else:
+            room.players.pop(s.color, None)
+            s.room = s.color = None
+            if not room.players:
+                self._close_spectators(room, {"type": "GAME_OVER", "winner": None, "reason": "房间关闭"})
+                self.rooms.pop(room.id, None)
+
+async def _report(server, interval):
+    last, t0 = dict(server.stats), time.time()
+    while True:
+        await asyncio.sleep(interval)
+        now, t1 = dict(server.stats), time.time()
+        el = t1 - t0
+        print(f"连接 {len(server.sessions)} 房间 {len(server.rooms)} "
+              f"对局/秒 {(now['finished'] - last['finished']) / el:.1f} 着法/秒 {(now['moves'] - last['moves']) / el:.0f}")
+        last, t0 = now, t1
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="asyncio 对战服务器")
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT)
+    ap.add_argument("--report", type=float, default=0, help="每隔多少秒打印一次统计, 0 不打印")
+    ap.add_argument("--users", action="store_true", help="启用用户库: 登录校验、等级分匹配和计分")
+    ap.add_argument("--archive", default=None, help="对局库文件, 终局的对局都追加进去")
+    a = ap.parse_args(argv)
+    users = archive = None
+    if a.users:
+        from user_manager import UserManager
+        users = UserManager()
+    if a.archive:
+        from game_archive import GameArchive
+        archive = GameArchive(a.archive)
+    server = GameServer(users, archive)
+
+    async def run():
+        if a.report: asyncio.ensure_future(_report(server, a.report))
+        await server.serve(a.host, a.port)
+    print(f"服务启动，监听端口 {a.port}...")
+    try: asyncio.run(run())
+    except KeyboardInterrupt: pass
+    finally:
+        if archive is not None: archive.close()
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,7 @@ from tkinter import filedialog, simpledialog, messagebox, ttk
 from game_core import GameFactory, AIFactory, BLACK, WHITE, EMPTY
 from user_manager import UserManager
 from network_mgr import NetworkManager
+from replay import ReplayEngine
 
 # --- 全局配置 ---
 SCREEN_W, SCREEN_H = 960, 700
@@ -82,7 +83,7 @@ class GUIClient:
         # AI 对象
         self.ai_black = None; self.ai_white = None
         self.last_ai_time = 0 # AI 思考冷却
-        self.replay_moves = []; self.replay_idx = 0
+        self.replay = None # ReplayEngine, 回放时 self.game 即其 view
         
         self.init_menu_buttons()
 
@@ -151,6 +152,7 @@ class GUIClient:
                 # AI 无棋可下
                 if hasattr(self.game, 'pass_turn'):
                     self.game.pass_turn(); self.log("AI Pass")
+                    if self.game.game_over: self.on_game_over()
                 else:
                     # 关键修改：
                     # 1. 强制设置游戏结束，防止死循环
@@ -244,7 +246,9 @@ class GUIClient:
             elif t == "UNDO": self.game.undo(); self.log("对方悔棋")
             elif t == "SURRENDER": self.log(self.game.surrender()); self.on_game_over()
             elif t == "PASS": 
-                if hasattr(self.game,'pass_turn'): self.game.pass_turn(); self.log("对方Pass")
+                if hasattr(self.game,'pass_turn'):
+                    self.game.pass_turn(); self.log("对方Pass")
+                    if self.game.game_over: self.on_game_over()
             elif t == "DISCONNECT":
                 self.log("断开连接"); self.back_menu()
 
@@ -286,9 +290,13 @@ class GUIClient:
         root = tk.Tk(); root.withdraw(); root.attributes('-topmost',True)
         messagebox.showinfo("结束", title)
         root.destroy(); pygame.event.clear()
-        if self.um.current_user: self.um.update_stats(is_win)
+        if self.um.current_user:
+            # 只记胜负, 不计等级分: 本地/人机对局没有真实对手, 点对点联机时对方的名字未经验证;
+            # 等级分只由 game_server 在双方都登录校验过时计
+            self.um.update_stats(is_win)
 
     def on_game_over(self):
+        if self.is_network_game and self.net: self.net.end_game() # 之后断线不必等重连
         w = self.game.winner
         msg = "黑方胜" if w==BLACK else ("白方胜" if w==WHITE else "平局")
         is_win = False
@@ -310,6 +318,7 @@ class GUIClient:
         if hasattr(self.game,'pass_turn'):
             self.game.pass_turn()
             if self.is_network_game: self.net_send_action("PASS")
+            if self.game.game_over: self.on_game_over()
 
     # --- 登录注册 ---
     def cmd_login(self):
@@ -353,6 +362,7 @@ class GUIClient:
                     if b.handle_event(e): handled=True; break
                 if handled: continue
                 
+                if self.state == "REPLAY" and self.replay: self._handle_replay_event(e)
                 if self.state == "GAME" and e.type == pygame.MOUSEBUTTONDOWN and e.button == 1:
                     can = True
                     if self.is_network_game and self.game.current_player != self.my_net_color: can=False
@@ -439,6 +449,13 @@ class GUIClient:
             c = (200,0,0) if self.game.current_player==self.my_net_color else (100,100,100)
             self.screen.blit(self.res.s_font.render(f"{role} | {turn}", True, c), (px+10, 150))
 
+        if self.state == "REPLAY" and self.replay:
+            x, y, w, h = self.replay_seek_bar()
+            n = max(1, len(self.replay))
+            pygame.draw.rect(self.screen, (200,200,200), (x, y, w, h))
+            pygame.draw.rect(self.screen, COLORS['btn'], (x, y, int(w * self.replay.ply / n), h))
+            self.screen.blit(self.res.s_font.render(f"第 {self.replay.ply} / {len(self.replay)} 手", True, (0,0,0)), (x, y+16))
+
         y = SCREEN_H - 290
         for l in self.logs:
             self.screen.blit(self.res.s_font.render(str(l), True, (100,100,100)), (px+5, y)); y+=20
@@ -479,12 +496,14 @@ class GUIClient:
         else:
             self.buttons.append(Button(x, y, 160, 35, "上一步", lambda: self.replay_step(-1)))
             self.buttons.append(Button(x, y+45, 160, 35, "下一步", lambda: self.replay_step(1)))
+            self.buttons.append(Button(x, y+90, 75, 35, "<<10", lambda: self.replay_step(-10)))
+            self.buttons.append(Button(x+85, y+90, 75, 35, "10>>", lambda: self.replay_step(10)))
         
         self.buttons.append(Button(x, y+200, 160, 35, "返回菜单", self.back_menu))
 
     def back_menu(self):
         if self.net: self.net.close(); self.net=None
-        self.state="MENU"; self.game=None; self.init_menu_buttons()
+        self.state="MENU"; self.game=None; self.replay=None; self.init_menu_buttons()
     def ch_size(self, d):
         n = self.sel_size+d
         if 8<=n<=19: self.sel_size=n; self.init_menu_buttons()
@@ -493,6 +512,7 @@ class GUIClient:
         root = tk.Tk(); root.withdraw(); root.attributes('-topmost',True)
         try:
             if mode=='save': p = filedialog.asksaveasfilename(defaultextension=".json")
+            elif mode=='replay': p = filedialog.askopenfilename(filetypes=[("棋谱","*.json *.gar")])
             else: p = filedialog.askopenfilename(filetypes=[("JSON","*.json")])
         except: p = None
         root.destroy(); pygame.event.clear()
@@ -522,29 +542,52 @@ class GUIClient:
             self.log(msg)
 
     def cmd_replay(self):
-        p = self._get_file('load')
+        p = self._get_file('replay')
         if not p: return
         try:
-            with open(p) as f: d = json.load(f)
-            t_map = {'GomokuGame':'gomoku','GoGame':'go','ReversiGame':'reversi'}
-            self.game = GameFactory.create_game(t_map.get(d.get('type')), d.get('size',15))
-            self.replay_moves = d.get('history', [])
-            if not self.replay_moves: self.replay_moves = d.get('move_history', [])
-            self.replay_idx = 0
-            self.game = GameFactory.create_game(t_map.get(d.get('type')), d.get('size',15))
+            if p.endswith('.gar'):
+                from game_archive import GameArchive
+                arc = GameArchive(p)
+                root = tk.Tk(); root.withdraw(); root.attributes('-topmost',True)
+                gid = simpledialog.askinteger("对局库", f"对局编号 (1-{len(arc)}):", initialvalue=len(arc))
+                root.destroy(); pygame.event.clear()
+                rec = arc.get(gid) if gid else None
+                arc.close()
+                if not rec: return
+                self.replay = ReplayEngine.from_record(rec)
+                self.p_black_name, self.p_white_name = rec.black or '未知', rec.white or '未知'
+            else:
+                with open(p) as f: d = json.load(f)
+                t_map = {'GomokuGame':'gomoku','GoGame':'go','ReversiGame':'reversi'}
+                moves = d.get('history') or d.get('move_history', [])
+                self.replay = ReplayEngine(t_map.get(d.get('type')), d.get('size',15), [m if m == "PASS" else tuple(m) for m in moves])
+                meta = d.get('meta', {})
+                self.p_black_name, self.p_white_name = meta.get('black', '未知'), meta.get('white', '未知')
+            self.game = self.replay.view
             self.state = "REPLAY"
             self.mode_name = "回放"
             self.init_game_buttons()
         except: self.log("回放失败")
 
     def replay_step(self, d):
-        if d == 1 and self.replay_idx < len(self.replay_moves):
-            mv = self.replay_moves[self.replay_idx]; self.replay_idx += 1
-            if mv == "PASS": 
-                if hasattr(self.game, 'pass_turn'): self.game.pass_turn()
-            else: self.game.place_stone(mv[0], mv[1])
-        elif d == -1 and self.replay_idx > 0:
-            self.game.undo(); self.replay_idx -= 1
+        """前进/后退 d 手, 远跳由 ReplayEngine 从最近的快照出发"""
+        if self.replay: self.replay.step(d)
+
+    def replay_seek_bar(self):
+        """回放进度条的位置 (x, y, 宽, 高)"""
+        return (SCREEN_W-PANEL_W+20, 325, 160, 12)
+
+    def _handle_replay_event(self, e):
+        """方向键单步, PageUp/PageDown 跳 10 手, Home/End 到头尾; 在进度条上点击或拖动可拖拽定位"""
+        if e.type == pygame.KEYDOWN:
+            k = {pygame.K_LEFT: -1, pygame.K_RIGHT: 1, pygame.K_PAGEUP: -10, pygame.K_PAGEDOWN: 10}.get(e.key)
+            if k: self.replay_step(k)
+            elif e.key == pygame.K_HOME: self.replay.seek(0)
+            elif e.key == pygame.K_END: self.replay.seek(len(self.replay))
+        elif e.type == pygame.MOUSEBUTTONDOWN and e.button == 1 or e.type == pygame.MOUSEMOTION and e.buttons[0]:
+            x, y, w, h = self.replay_seek_bar()
+            if x <= e.pos[0] <= x+w and y-6 <= e.pos[1] <= y+h+6:
+                self.replay.seek(round((e.pos[0]-x) / w * len(self.replay)))
 
 if __name__ == "__main__":
     GUIClient().run()
\ No newline at end of file
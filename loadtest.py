@@ -0,0 +1,146 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from game_core import GameFactory, BLACK
+from network_mgr import DEFAULT_PORT, encode_frame, FrameDecoder
+from game_server import GameServer
+
+class LoadStats:
+    def __init__(self):
+        self.matches = 0
+        self.moves = 0
+        self.errors = 0
+        self.sent = {} # (房间, 第几手) -> 发出时间, 同进程内双方共用
+        self.latency = [] # 对方收到着法的延迟(秒)
+        self.watch_frames = 0
+        self.snapshots = 0
+        self.gaps = 0 # 观战者收到的增量序号不连续 (应为 0, 掉队时服务端改发快照)
+        self.watchers = [] # 观战协程
+
+def percentile(xs, p):
+    if not xs: return 0
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * p))]
+
+async def watcher(host, port, room, stats):
+    """观战: 一次快照 + 逐手增量, 检查序号连续"""
+    reader, writer = await asyncio.open_connection(host, port)
+    dec = FrameDecoder()
+    writer.write(encode_frame({"type": "WATCH", "room": room}))
+    seq = None
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data: return
+            for msg in dec.feed(data):
+                stats.watch_frames += 1
+                if msg["type"] == "SNAPSHOT": seq = msg["seq"]; stats.snapshots += 1
+                elif msg["type"] == "DELTA":
+                    if seq is not None and msg["seq"] != seq + 1: stats.gaps += 1
+                    seq = msg["seq"]
+                elif msg["type"] in ("GAME_OVER", "ERROR"): return
+    finally:
+        writer.close()
+
+async def bot(name, host, port, gtype, size, stats, deadline, encoding, rng, watchers=0):
+    """随机走子的客户端: 排队 -> 下完一局 -> 再排队, 直到 deadline"""
+    reader, writer = await asyncio.open_connection(host, port)
+    dec = FrameDecoder()
+    enc = "json"
+    def send(m): writer.write(encode_frame(m, enc))
+    send({"type": "HELLO", "name": name})
+    send({"type": "QUEUE", "gtype": gtype, "size": size})
+    game = room = color = None
+    ply = 0
+
+    def play():
+        nonlocal ply
+        moves = game.get_valid_moves(game.current_player)
+        if not moves or len(game.move_history) > size * size * 2: # 随机对局可能下不完
+            send({"type": "SURRENDER"}); return
+        r, c = rng.choice(moves)
+        game.place_stone(r, c)
+        stats.sent[(room, ply)] = time.perf_counter(); ply += 1
+        send({"type": "MOVE", "r": r, "c": c})
+        if not game.game_over and game.current_player == color: play() # 黑白棋对方自动 Pass
+
+    try:
+        while True:
+            await writer.drain()
+            if game is None and time.time() >= deadline: # 到时后排队等不到对手就退出
+                try: data = await asyncio.wait_for(reader.read(65536), 1.0)
+                except asyncio.TimeoutError: return
+            else: data = await reader.read(65536)
+            if not data: break
+            for msg in dec.feed(data):
+                t = msg["type"]
+                if t == "START":
+                    send({"type": "ENC", "encoding": encoding}); enc = encoding
+                    game = GameFactory.create_game(msg["gtype"], msg["size"])
+                    room, color, ply = msg["room"], msg["your_color"], 0
+                    if color == BLACK:
+                        stats.watchers += [asyncio.ensure_future(watcher(host, port, room, stats)) for _ in range(watchers)]
+                    if game.current_player == color: play()
+                elif t == "MOVE":
+                    sent = stats.sent.pop((room, ply), None)
+                    if sent is not None: stats.latency.append(time.perf_counter() - sent)
+                    ply += 1; stats.moves += 1
+                    game.place_stone(msg["r"], msg["c"])
+                    if not game.game_over and game.current_player == color: play()
+                elif t == "PASS":
+                    game.pass_turn()
+                    if not game.game_over and game.current_player == color: play()
+                elif t == "GAME_OVER":
+                    if color == BLACK: stats.matches += 1 # 每局只由黑方计一次
+                    game = room = None
+                    if time.time() >= deadline: return
+                    send({"type": "QUEUE", "gtype": gtype, "size": size})
+                elif t == "ERROR": stats.errors += 1
+    finally:
+        writer.close()
+
+async def run_load(clients=200, duration=10.0, gtype="reversi", size=8, encoding="bin",
+                   host=None, port=DEFAULT_PORT, seed=0, watchers=0):
+    """clients 个随机客户端两两对局 duration 秒, 每局另有 watchers 个观战者; host 为空时在本进程内起服务器"""
+    server = srv = None
+    if host is None:
+        server = GameServer()
+        srv = await asyncio.start_server(server.handle_client, '127.0.0.1', 0, backlog=4096)
+        host, port = '127.0.0.1', srv.sockets[0].getsockname()[1]
+    stats = LoadStats()
+    start = time.time()
+    deadline = start + duration
+    await asyncio.gather(*(bot(f"bot{i}", host, port, gtype, size, stats, deadline, encoding, random.Random(seed + i), watchers)
+                           for i in range(clients)))
+    if stats.watchers: await asyncio.gather(*stats.watchers)
+    el = time.time() - start
+    if srv: srv.close(); await srv.wait_closed()
+    lat = stats.latency
+    return {"clients": clients, "gtype": gtype, "size": size, "encoding": encoding,
+            "matches": stats.matches, "moves": stats.moves, "errors": stats.errors, "time": round(el, 3),
+            "matches_per_sec": round(stats.matches / el, 2), "moves_per_sec": round(stats.moves / el, 1),
+            "latency_ms": {"p50": round(percentile(lat, 0.5) * 1000, 3), "p95": round(percentile(lat, 0.95) * 1000, 3),
+                           "p99": round(percentile(lat, 0.99) * 1000, 3), "max": round(max(lat, default=0) * 1000, 3)},
+            "watch": {"frames": stats.watch_frames, "snapshots": stats.snapshots, "gaps": stats.gaps},
+            "server": server.stats if server else None}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="对战服务器压测")
+    ap.add_argument("-c", "--clients", type=int, default=200, help="并发客户端数 (两两成局)")
+    ap.add_argument("-t", "--duration", type=float, default=10.0, help="持续秒数, 到时下完当前对局即停")
+    ap.add_argument("--game", default="reversi", choices=["gomoku", "reversi", "go"])
+    ap.add_argument("--size", type=int, default=None)
+    ap.add_argument("--encoding", default="bin", choices=["bin", "json"])
+    ap.add_argument("-w", "--watchers", type=int, default=0, help="每局的观战者数")
+    ap.add_argument("--host", default=None, help="压测已有服务器, 不填则在本进程内启动")
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT)
+    a = ap.parse_args(argv)
+    size = 8 if a.game == "reversi" else (a.size or {"gomoku": 15, "go": 9}[a.game])
+    res = asyncio.run(run_load(a.clients, a.duration, a.game, size, a.encoding, a.host, a.port, watchers=a.watchers))
+    print(json.dumps(res, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
+import secrets
 import socket
+import struct
 import threading
 import json
 import queue
@@ -7,6 +9,59 @@ import time
 # 默认端口
 DEFAULT_PORT = 8899
 
+# 帧格式: 长度(u32, 大端, 不含头) + 类型(u8) + 负载
+#   FRAME_JSON: 负载为 UTF-8 JSON
+#   FRAME_MOVE: 负载为 r(u8) c(u8), 即 {"type": "MOVE", "r": r, "c": c} 的紧凑形式
+FRAME_HEADER = struct.Struct('>IB')
+FRAME_JSON = 0
+FRAME_MOVE = 1
+MOVE_BODY = struct.Struct('>BB')
+MAX_FRAME = 1 << 20 # 超过视为协议错误
+ENCODINGS = ["bin", "json"] # 本端支持的编码, 按优先级排列
+GAME_ACTIONS = ("MOVE", "PASS", "UNDO", "SURRENDER") # 记入对局日志, 重连时按对方的确认数补发
+RECONNECT_GRACE = 60 # 掉线后等待重连的秒数
+
+def encode_frame(msg, encoding="json"):
+    """把消息字典打包成一帧; encoding 为 bin 时 MOVE 走二进制"""
+    if encoding == "bin" and msg.get("type") == "MOVE" and msg.keys() == {"type", "r", "c"}:
+        return FRAME_HEADER.pack(MOVE_BODY.size, FRAME_MOVE) + MOVE_BODY.pack(msg["r"], msg["c"])
+    body = json.dumps(msg).encode('utf-8')
+    return FRAME_HEADER.pack(len(body), FRAME_JSON) + body
+
+class FrameDecoder:
+    """接收缓冲: feed 任意切分的字节流, 返回其中完整的消息, 不完整的留到下次.
+    长度合法但内容坏的帧跳过, 原因记在 errors 里由调用方取走上报; 长度超限抛 ValueError (流已无法对齐)"""
+    def __init__(self):
+        self.buf = bytearray()
+        self.errors = []
+
+    def feed(self, data):
+        self.buf += data
+        msgs, pos = [], 0
+        while len(self.buf) - pos >= FRAME_HEADER.size:
+            n, kind = FRAME_HEADER.unpack_from(self.buf, pos)
+            if n > MAX_FRAME: raise ValueError(f"帧过长: {n}")
+            end = pos + FRAME_HEADER.size + n
+            if len(self.buf) < end: break
+            body = bytes(self.buf[pos + FRAME_HEADER.size:end])
+            pos = end
+            if kind == FRAME_MOVE:
+                if n != MOVE_BODY.size: self.errors.append(f"MOVE 帧长度错误: {n}"); continue
+                r, c = MOVE_BODY.unpack(body)
+                msgs.append({"type": "MOVE", "r": r, "c": c})
+            elif kind == FRAME_JSON:
+                try: msgs.append(json.loads(body.decode('utf-8')))
+                except ValueError: self.errors.append("JSON 解析失败")
+            else: self.errors.append(f"未知帧类型: {kind}")
+        del self.buf[:pos]
+        return msgs
+
+def _close_sock(sock):
+    """先 shutdown 再 close: 其他线程阻塞在 recv/accept 时单纯 close 不会让对方收到 FIN, 也唤不醒它们"""
+    try: sock.shutdown(socket.SHUT_RDWR)
+    except OSError: pass
+    sock.close()
+
 class NetworkManager:
     def __init__(self, is_server=False):
         self.is_server = is_server
@@ -16,6 +71,15 @@ class NetworkManager:
         self.msg_queue = queue.Queue() # 消息队列，供GUI轮询
         self.connected = False
         self.remote_addr = None
+        self.encoding = "json" # START 握手后可能升级为 bin
+        self.send_lock = threading.Lock() # 界面线程和接收线程都会发送
+        # 断线重连: START 时主机发令牌; 每个方向单独计数, 各自只记本方发出的动作和收到的对方动作数
+        self.token = None
+        self.sent = [] # 本方发出的对局动作, 下标即序号
+        self.recvd = 0 # 已收到的对方动作数, 即对方 sent 中已确认的前缀
+        self.over = False # 本局已结束, 等对方确认 (BYE) 后作废令牌
+        self.server_addr = None # 客机重连的地址
+        self.lost_at = None # 主机: 对方掉线的时刻
 
     def start_server(self, port=DEFAULT_PORT):
         """启动服务端，等待连接"""
@@ -29,62 +93,185 @@ class NetworkManager:
             return False, str(e)
 
     def _accept_client(self):
+        """第一个连接用来开局; 开局后的新连接只接受带有效令牌的 RESUME"""
+        while self.running:
+            try: conn, addr = self.sock.accept()
+            except OSError: break
+            if self.conn is None:
+                self.remote_addr = addr
+                self._attach(conn)
+                self.msg_queue.put({"type": "SYS", "msg": f"客户端 {addr} 已连接"})
+            else:
+                threading.Thread(target=self._accept_resume, args=(conn,), daemon=True).start()
+
+    def _accept_resume(self, conn):
+        dec, msgs = FrameDecoder(), []
         try:
-            self.conn, addr = self.sock.accept()
-            self.remote_addr = addr
-            self.connected = True
-            self.msg_queue.put({"type": "SYS", "msg": f"客户端 {addr} 已连接"})
-            # 开启接收线程
-            threading.Thread(target=self._recv_loop, daemon=True).start()
-        except:
-            pass
+            conn.settimeout(5)
+            while not msgs:
+                data = conn.recv(4096)
+                if not data: raise ConnectionError()
+                msgs = dec.feed(data)
+            conn.settimeout(None)
+        except (OSError, ValueError):
+            conn.close(); return
+        msg = msgs[0]
+        if msg.get("type") != "RESUME" or not self.token or msg.get("token") != self.token:
+            conn.close(); return
+        acked = msg.get("recvd", 0)
+        if not isinstance(acked, int) or not 0 <= acked <= len(self.sent):
+            conn.close(); return
+        old = self.conn
+        with self.send_lock: # RESUMED 发出前不算已连接, 否则界面此时发的动作会既直发又在补发里
+            missing = self.sent[acked:]
+            try: conn.sendall(encode_frame({"type": "RESUMED", "recvd": self.recvd, "moves": missing, "encodings": ENCODINGS}))
+            except OSError: conn.close(); return
+            self._attach(conn, dec, msgs[1:], locked=True)
+        if old: _close_sock(old)
+        self.msg_queue.put({"type": "SYS", "msg": f"对方已重连, 补发 {len(missing)} 步"})
+        if self.over: self.end_game()
 
     def connect_to_server(self, ip, port=DEFAULT_PORT):
         """连接到服务端"""
         try:
             self.sock.connect((ip, port))
-            self.conn = self.sock
-            self.connected = True
+            self.server_addr = (ip, port)
+            self._attach(self.sock)
             self.msg_queue.put({"type": "SYS", "msg": f"已连接到 {ip}:{port}"})
-            threading.Thread(target=self._recv_loop, daemon=True).start()
             return True, "连接成功"
         except Exception as e:
             return False, str(e)
 
-    def _recv_loop(self):
-        """后台接收消息循环"""
-        while self.running and self.conn:
+    def _attach(self, conn, decoder=None, pending=(), connected=True, locked=False):
+        """换上新连接并开启接收线程; 旧连接的接收线程发现 self.conn 变了会自行退出.
+        connected=False 时先不发界面的动作 (客机重连要等 RESUMED 补发完); locked 表示调用方已持有 send_lock"""
+        if not locked: self.send_lock.acquire()
+        try:
+            self.conn = conn
+            self.encoding = "json"
+            self.connected = connected
+        finally:
+            if not locked: self.send_lock.release()
+        threading.Thread(target=self._recv_loop, args=(conn, decoder, pending), daemon=True).start()
+
+    def _recv_loop(self, conn, decoder=None, pending=()):
+        """后台接收消息循环, 一次 recv 可能含半帧或多帧"""
+        decoder = decoder or FrameDecoder()
+        for msg in pending: self._dispatch(msg)
+        while self.running and self.conn is conn:
             try:
-                data = self.conn.recv(4096)
+                data = conn.recv(65536)
                 if not data: break
-                
-                msg_str = data.decode('utf-8')
-                try:
-                    msg = json.loads(msg_str)
-                    self.msg_queue.put(msg)
-                except:
-                    print(f"解析失败: {msg_str}")
-                    
+                for msg in decoder.feed(data): self._dispatch(msg)
+                if decoder.errors: # 坏帧只跳过, 不当作断线
+                    self.msg_queue.put({"type": "SYS", "msg": f"收到无法解析的消息: {decoder.errors[-1]}"})
+                    decoder.errors.clear()
             except ConnectionResetError:
                 break
             except Exception as e:
-                print(f"网络错误: {e}")
+                if self.conn is conn: print(f"网络错误: {e}")
                 break
-        
+
+        if self.conn is not conn: return # 已被重连替换
         self.connected = False
+        if self.running and self.token: # 对局中掉线: 客机去重连, 主机等对方回来
+            self.msg_queue.put({"type": "SYS", "msg": "连接断开, 等待重连..."})
+            if self.is_server:
+                self.lost_at = stamp = time.time()
+                t = threading.Timer(RECONNECT_GRACE, self._give_up, args=(stamp,))
+                t.daemon = True; t.start()
+            else:
+                threading.Thread(target=self._reconnect, daemon=True).start()
+            return
         self.msg_queue.put({"type": "SYS", "msg": "连接断开"})
         self.msg_queue.put({"type": "DISCONNECT"})
 
-    def send(self, data_dict):
-        """发送JSON消息"""
-        if self.conn and self.connected:
+    def _give_up(self, stamp):
+        if self.running and not self.connected and self.lost_at == stamp:
+            self.msg_queue.put({"type": "SYS", "msg": "重连超时"})
+            self.msg_queue.put({"type": "DISCONNECT"})
+
+    def _reconnect(self):
+        """客机: 退避重试, 连上后发 RESUME{token, recvd}, 对方回 RESUMED 补齐缺的动作"""
+        deadline, wait = time.time() + RECONNECT_GRACE, 0.5
+        while self.running and time.time() < deadline:
             try:
-                msg = json.dumps(data_dict)
-                self.conn.sendall(msg.encode('utf-8'))
-            except Exception as e:
-                print(f"发送失败: {e}")
+                conn = socket.create_connection(self.server_addr, timeout=5)
+                conn.settimeout(None)
+                with self.send_lock: # recvd 只在接收线程里变, 此时旧接收线程已退出
+                    conn.sendall(encode_frame({"type": "RESUME", "token": self.token, "recvd": self.recvd}))
+                self._attach(conn, connected=False)
+                return
+            except OSError:
+                time.sleep(wait); wait = min(wait * 2, 5)
+        self._give_up(self.lost_at)
+
+    def _dispatch(self, msg):
+        if self._handle_handshake(msg): return
+        if msg.get("type") in GAME_ACTIONS: self.recvd += 1
+        self.msg_queue.put(msg)
+
+    def _handle_handshake(self, msg):
+        """编码协商: 主机在 START 里列出支持的编码, 客机选定后回 ENC; 返回 True 表示消息已处理"""
+        t = msg.get("type")
+        if t in ("START", "RESUMED"):
+            common = [e for e in msg.get("encodings", []) if e in ENCODINGS]
+            enc = common[0] if common else "json"
+            self._send_frame({"type": "ENC", "encoding": enc})
+            self.encoding = enc
+        if t == "START":
+            self.token = msg.get("token"); self.sent = []; self.recvd = 0; self.over = False
+        elif t == "RESUMED":
+            missing = msg.get("moves", [])
+            for m in missing: self._dispatch(m)
+            acked = msg.get("recvd", 0)
+            with self.send_lock: # 补发完才算已连接, 之后界面的动作直接发
+                resend = self.sent[acked:] # 断线时对方没收到的本方动作
+                for m in resend: self._write_frame(m)
+                self.connected = True
+            self.msg_queue.put({"type": "SYS", "msg": f"重连成功, 收到 {len(missing)} 步, 补发 {len(resend)} 步"})
+            if self.over: self.end_game()
+            return True
+        elif t == "BYE": # 对方主动离开或对局已结束, 掉线后不必再等重连
+            self.token = None
+            return True
+        elif t == "GAME_OVER": # 对战服务器判的终局, 令牌随之失效
+            self.token = None
+        elif t == "ENC":
+            if msg.get("encoding") in ENCODINGS: self.encoding = msg["encoding"]
+            return True
+        return False
+
+    def send(self, data_dict):
+        """发送一帧消息, 对方确认前一律用 JSON; 掉线期间的对局动作先记日志, 重连后补发"""
+        t = data_dict.get("type")
+        if t == "START":
+            self.token = secrets.token_hex(8); self.sent = []; self.recvd = 0; self.over = False
+            data_dict = dict(data_dict, encodings=ENCODINGS, token=self.token)
+        with self.send_lock: # 记日志和判断是否在线要与重连补发互斥, 否则动作可能重发或漏发
+            if t in GAME_ACTIONS and self.token: self.sent.append(data_dict)
+            if self.conn and self.connected: self._write_frame(data_dict)
+
+    def _send_frame(self, data_dict):
+        with self.send_lock: self._write_frame(data_dict)
+
+    def _write_frame(self, data_dict):
+        """调用方须持有 send_lock"""
+        try: self.conn.sendall(encode_frame(data_dict, self.encoding))
+        except Exception as e: print(f"发送失败: {e}")
+
+    def end_game(self):
+        """对局结束: 通知对方并作废令牌, 之后断线直接按断开处理.
+        此时掉线则保留令牌, 等重连补齐最后几步后再发 BYE"""
+        self.over = True
+        if not (self.token and self.conn and self.connected): return
+        self._send_frame({"type": "BYE"})
+        self.token = None
 
     def close(self):
+        """主动离开: 先发 BYE, 对方立即收到断开而不是等待重连"""
+        if self.token and self.conn and self.connected: self._send_frame({"type": "BYE"})
+        self.token = None
         self.running = False
-        if self.conn: self.conn.close()
-        if self.sock: self.sock.close()
\ No newline at end of file
+        if self.conn: _close_sock(self.conn)
+        if self.sock: _close_sock(self.sock)
@@ -0,0 +1,153 @@
+import argparse
+import json
+import math
+import mmap
+import os
+import struct
+
+# 文件格式: 头部 + 按 (key, -score) 排序的定长记录
+#   头部  : magic(4) version(u32) count(u64)
+#   记录  : key(u64 局面哈希) move(u16 = r<<8|c) score(i16 行棋方胜率, 万分比) count(u32 局数)
+BOOK_MAGIC = b'OBK1'
+BOOK_VERSION = 1
+HEADER = struct.Struct('<4sIQ')
+ENTRY = struct.Struct('<QHhI')
+BOOK_DIR = "books" # AIFactory 默认到这里找 <棋种>.book
+MIN_COUNT = 5 # 少于这么多局的着法不收录, 查书时也不用
+CONFIDENCE_Z = 1.96 # 按胜率 95% 置信区间的下界排序, 局数少的着法不会因偶然全胜排在前面
+
+_OPEN_BOOKS = {}
+
+class OpeningBook:
+    """只读开局库: mmap 映射文件, 二分查找, 不把记录读进内存"""
+    def __init__(self, path):
+        self.path = path
+        self.f = open(path, 'rb')
+        self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, ver, self.count = HEADER.unpack_from(self.mm, 0)
+        if magic != BOOK_MAGIC or ver != BOOK_VERSION: raise ValueError("开局库格式不符")
+        if HEADER.size + self.count * ENTRY.size > len(self.mm): raise ValueError("开局库文件不完整")
+
+    @staticmethod
+    def open_default(game_type):
+        """打开 books/<棋种>.book, 不存在返回 None; 同一文件只映射一次"""
+        path = os.path.join(BOOK_DIR, f"{game_type}.book")
+        if path not in _OPEN_BOOKS:
+            try: _OPEN_BOOKS[path] = OpeningBook(path) if os.path.exists(path) else None
+            except (OSError, ValueError): _OPEN_BOOKS[path] = None
+        return _OPEN_BOOKS[path]
+
+    def _key_at(self, i):
+        return struct.unpack_from('<Q', self.mm, HEADER.size + i * ENTRY.size)[0]
+
+    def lookup(self, key):
+        """返回该局面的所有记录 [((r,c), score, count), ...], 已按分数从高到低"""
+        lo, hi = 0, self.count
+        while lo < hi: # 找第一个 >= key 的位置
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < key: lo = mid + 1
+            else: hi = mid
+        res = []
+        while lo < self.count:
+            k, mv, score, cnt = ENTRY.unpack_from(self.mm, HEADER.size + lo * ENTRY.size)
+            if k != key: break
+            res.append(((mv >> 8, mv & 0xFF), score, cnt))
+            lo += 1
+        return res
+
+    def best_move(self, game, min_count=MIN_COUNT):
+        """当前局面书里胜率下界最高且合法的着法, 没有返回 None"""
+        entries = [e for e in self.lookup(game.position_hash()) if e[2] >= min_count]
+        entries.sort(key=lambda e: -lower_bound(e[1], e[2]))
+        for mv, score, cnt in entries:
+            if mv in game.get_valid_moves(game.current_player): return mv
+        return None
+
+    def close(self):
+        self.mm.close(); self.f.close()
+
+    def __len__(self): return self.count
+
+def lower_bound(score, count, z=CONFIDENCE_Z):
+    """胜率 (score 为万分比) 的 Wilson 置信区间下界"""
+    p, n = score / 10000, count
+    if n <= 0: return 0.0
+    d = z * z / n
+    return (p + d / 2 - z * math.sqrt(p * (1 - p) / n + d / (4 * n))) / (1 + d)
+
+class BookBuilder:
+    """从对局记录统计每个局面下各着法的胜率, 写成开局库文件"""
+    def __init__(self, max_ply=16):
+        self.max_ply = max_ply
+        self.stats = {} # (key, move) -> [胜, 和, 局数]
+        self.games = 0
+
+    def add_game(self, gtype, size, history, winner=None):
+        """重放一局; winner 为空时按重放结果判断, 未分胜负(也不是和棋)的对局跳过"""
+        from game_core import GameFactory
+        g = GameFactory.create_game(gtype, size)
+        seen = []
+        for i, mv in enumerate(history):
+            if mv == "PASS":
+                if len(g.move_history) > i: continue # 黑白棋的 Pass 由规则自动补上
+                if not hasattr(g, 'pass_turn'): return False
+                g.pass_turn(); continue
+            r, c = mv
+            if i < self.max_ply: seen.append((g.position_hash(), (r, c), g.current_player))
+            if not g.place_stone(r, c)[0]: return False
+        if winner is None:
+            if not g.game_over: return False
+            winner = g.winner
+        for key, mv, player in seen:
+            s = self.stats.setdefault((key, mv), [0, 0, 0])
+            if winner == player: s[0] += 1
+            elif winner is None: s[1] += 1
+            s[2] += 1
+        self.games += 1
+        return True
+
+    def add_file(self, path):
+        """读取 save_to_file 存的 .json 或 selfplay 输出的 .jsonl"""
+        t_map = {'GomokuGame': 'gomoku', 'GoGame': 'go', 'ReversiGame': 'reversi'}
+        n = 0
+        with open(path, encoding='utf-8') as f:
+            if path.endswith('.jsonl'):
+                for line in f:
+                    d = json.loads(line)
+                    if d.get('history') is None or not d.get('finished', True): continue
+                    n += self.add_game(d['type'], d['size'], d['history'], d.get('winner'))
+            else:
+                d = json.load(f)
+                hist = d.get('history') or d.get('move_history', []) # 兼容旧存档
+                n += self.add_game(t_map.get(d['type'], d['type']), d['size'], hist)
+        return n
+
+    def write(self, path, min_count=MIN_COUNT):
+        rows = []
+        for (key, (r, c)), (win, draw, cnt) in self.stats.items():
+            if cnt < min_count: continue
+            score = round((win + draw / 2) / cnt * 10000)
+            rows.append((key, (r << 8) | c, score, cnt))
+        rows.sort(key=lambda e: (e[0], -e[2], -e[3]))
+        tmp = path + ".tmp"
+        with open(tmp, 'wb') as f:
+            f.write(HEADER.pack(BOOK_MAGIC, BOOK_VERSION, len(rows)))
+            for e in rows: f.write(ENTRY.pack(*e))
+        os.replace(tmp, path)
+        return len(rows)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="生成开局库")
+    ap.add_argument("out", help="输出文件, 如 books/reversi.book")
+    ap.add_argument("inputs", nargs="+", help="存档 .json 或自对弈结果 .jsonl")
+    ap.add_argument("--max-ply", type=int, default=16)
+    ap.add_argument("--min-count", type=int, default=MIN_COUNT, help="少于这么多局的着法不收录")
+    a = ap.parse_args(argv)
+    b = BookBuilder(a.max_ply)
+    for p in a.inputs: b.add_file(p)
+    if os.path.dirname(a.out): os.makedirs(os.path.dirname(a.out), exist_ok=True)
+    n = b.write(a.out, a.min_count)
+    print(f"{b.games} 局, {n} 条记录 -> {a.out}")
+
+if __name__ == "__main__":
+    main()
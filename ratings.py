@@ -0,0 +1,97 @@
+import bisect
+
+DEFAULT_RATING = 1500.0
+RATING_MIN, RATING_MAX = 0, 4000 # 排行榜分桶范围, 超出的按边界计
+
+def elo_expected(ra, rb):
+    """a 对 b 的期望得分"""
+    return 1 / (1 + 10 ** ((rb - ra) / 400))
+
+def elo_k(games):
+    """新手 K 大一些, 分数收敛快"""
+    return 40 if games < 30 else 20
+
+def elo_update(ra, rb, score, games=30):
+    """score: 1 胜, 0.5 和, 0 负; 返回 a 的新分"""
+    return ra + elo_k(games) * (score - elo_expected(ra, rb))
+
+class Leaderboard:
+    """单个棋种的排行榜: 分数取整分桶, 桶计数放在 Fenwick 树上.
+    名次和第 k 名都是 O(log R) (R 为分数范围, 与人数无关); 取整后同分的并列同一名次"""
+    def __init__(self, lo=RATING_MIN, hi=RATING_MAX):
+        self.lo, self.hi = lo, hi
+        self.n = hi - lo + 1
+        self.tree = [0] * (self.n + 1)
+        self.buckets = {} # 桶下标 -> {名字: 分数}
+        self.nonempty = [] # 非空桶下标, 有序
+        self.score = {}
+
+    def _idx(self, rating):
+        """高分在前: 下标 0 是最高分桶"""
+        return self.hi - min(self.hi, max(self.lo, int(round(rating))))
+
+    def _add(self, i, d):
+        i += 1
+        while i <= self.n:
+            self.tree[i] += d; i += i & -i
+
+    def _prefix(self, i):
+        """下标 < i 的桶里的人数"""
+        s = 0
+        while i > 0:
+            s += self.tree[i]; i -= i & -i
+        return s
+
+    def update(self, name, rating):
+        self.remove(name)
+        i = self._idx(rating)
+        b = self.buckets.get(i)
+        if b is None:
+            b = self.buckets[i] = {}
+            bisect.insort(self.nonempty, i)
+        b[name] = rating
+        self.score[name] = rating
+        self._add(i, 1)
+
+    def remove(self, name):
+        if name not in self.score: return
+        i = self._idx(self.score.pop(name))
+        b = self.buckets[i]
+        del b[name]
+        if not b:
+            del self.buckets[i]
+            del self.nonempty[bisect.bisect_left(self.nonempty, i)]
+        self._add(i, -1)
+
+    def rank(self, name):
+        """名次, 从 1 开始; 不在榜上返回 None"""
+        if name not in self.score: return None
+        return self._prefix(self._idx(self.score[name])) + 1
+
+    def kth(self, k):
+        """第 k 名 (从 1 开始) 所在的分数桶, Fenwick 树上二分查找"""
+        if not 1 <= k <= len(self.score): return None
+        pos, step = 0, 1 << self.n.bit_length()
+        while step:
+            if pos + step <= self.n and self.tree[pos + step] < k:
+                pos += step; k -= self.tree[pos]
+            step >>= 1
+        return self.hi - pos
+
+    def top(self, k, offset=0):
+        """第 offset+1 到 offset+k 名: [(名次, 名字, 分数), ...]"""
+        res = []
+        start = self.kth(offset + 1)
+        if start is None: return res
+        j = bisect.bisect_left(self.nonempty, self._idx(start))
+        while j < len(self.nonempty) and len(res) < k:
+            i = self.nonempty[j]
+            before = self._prefix(i)
+            for n, (name, r) in enumerate(sorted(self.buckets[i].items(), key=lambda e: (-e[1], e[0]))):
+                if before + n < offset: continue
+                res.append((before + 1, name, r))
+                if len(res) >= k: break
+            j += 1
+        return res
+
+    def __len__(self): return len(self.score)
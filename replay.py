@@ -0,0 +1,84 @@
+from game_core import GameFactory
+
+KEYFRAME_EVERY = 16 # 每隔多少手存一张整盘快照
+
+class ReplayEngine:
+    """棋谱回放: 每手只存棋盘差量 (落子、提子、翻转), 每 every 手存一张快照.
+    跳到任意一手时从当前位置或最近的快照出发, 最多回放 every/2 手差量; 后面的棋谱用到时才按规则推演"""
+    def __init__(self, gtype, size, moves, every=KEYFRAME_EVERY):
+        self.gtype, self.size, self.every = gtype, size, every
+        self.total = len(moves) if hasattr(moves, '__len__') else None # 推演完之前是棋谱长度, 之后为实际手数
+        self._src = iter(moves)
+        self._read = 0 # 已从棋谱取出的手数
+        self.sim = GameFactory.create_game(gtype, size) # 推演用, 始终停在已推演的最后一手
+        self.deltas = [] # 第 i 项: 第 i+1 手的 (变化列表, 之后的行棋方)
+        self.keyframes = [self._snapshot(self.sim)] # 第 k 张为第 k*every 手之后的棋盘
+        self.done = False
+        self.view = GameFactory.create_game(gtype, size) # 给界面显示的局面
+        self.first = self.view.current_player
+        self.ply = 0
+
+    @staticmethod
+    def from_record(rec, every=KEYFRAME_EVERY):
+        """rec 为 game_archive.GameRecord"""
+        return ReplayEngine(rec.gtype, rec.size, rec.moves, every)
+
+    @staticmethod
+    def _snapshot(g):
+        return bytes(v for row in g.board for v in row)
+
+    def _extend(self, ply):
+        """按规则推演到第 ply 手 (棋谱不够或遇到非法着法时停下)"""
+        g = self.sim
+        while len(self.deltas) < ply and not self.done:
+            m = next(self._src, None)
+            if m is None: self._finish(); break
+            self._read += 1
+            if m == "PASS":
+                if len(g.move_history) >= self._read: continue # 黑白棋的 Pass 由规则自动补上
+                if not hasattr(g, 'pass_turn') or g.game_over: self._finish(); break
+                g.pass_turn()
+            elif not g.place_stone(m[0], m[1])[0]: self._finish(); break
+            for d in g.undo_stack: # 一手可能带出自动 Pass, 各算一手
+                self.deltas.append((d.changes, d.player))
+                if len(self.deltas) % self.every == 0: self.keyframes.append(self._snapshot(g))
+            g.undo_stack.clear() # 差量已取走, 不再重复保存
+        return min(ply, len(self.deltas))
+
+    def _finish(self):
+        self.done = True; self.total = len(self.deltas)
+
+    def __len__(self):
+        """总手数; 还没推演完时按棋谱长度估计"""
+        return self.total if self.total is not None else len(self.deltas)
+
+    def seek(self, ply):
+        """跳到第 ply 手之后的局面, 返回实际到达的手数"""
+        ply = self._extend(max(0, ply))
+        v = self.view
+        if abs(ply - self.ply) > self.every // 2:
+            k = min((ply + self.every // 2) // self.every, len(self.keyframes) - 1)
+            if abs(k * self.every - ply) < abs(self.ply - ply): self._load(self.keyframes[k]); self.ply = k * self.every
+        while self.ply < ply:
+            for r, c, old, new in self.deltas[self.ply][0]: v._write(r, c, new)
+            self.ply += 1
+        while self.ply > ply:
+            self.ply -= 1
+            for r, c, old, new in reversed(self.deltas[self.ply][0]): v._write(r, c, old)
+        v.move_history = self.sim.move_history[:ply]
+        if ply == len(self.deltas): # 已推演到的最后一手, 局面与 sim 相同 (终局时行棋方可能被规则改过, 不在差量里)
+            v.current_player, v.game_over, v.winner = self.sim.current_player, self.sim.game_over, self.sim.winner
+        else:
+            v.current_player = self.deltas[ply - 1][1] if ply else self.first
+            v.game_over, v.winner = False, None
+        return ply
+
+    def step(self, d):
+        return self.seek(self.ply + d)
+
+    def _load(self, snap):
+        """把显示局面改成快照: 只写有差别的格子, 派生数据 (棋块、候选点等) 随 _write 增量更新"""
+        v, n = self.view, self.size
+        for i, p in enumerate(snap):
+            r, c = divmod(i, n)
+            if v.board[r][c] != p: v._write(r, c, p)
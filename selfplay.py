@@ -0,0 +1,119 @@
+import argparse
+import json
+import random
+import sys
+import time
+from multiprocessing import Pool
+
+from game_core import GameFactory, AIFactory, BLACK, WHITE
+
+# 默认棋盘尺寸
+DEFAULT_SIZE = {'gomoku': 15, 'reversi': 8, 'go': 9}
+
+def make_player(gtype, kind, time_limit=None):
+    """kind: 'ai' 用该棋种的 AI, 'random' 用随机 AI"""
+    ai = AIFactory.create_ai(gtype if kind == 'ai' else kind)
+    if time_limit is not None:
+        if hasattr(ai, 'time_limit'): ai.time_limit = time_limit
+        elif hasattr(ai, 'threats'): ai.threats.time_limit = time_limit # 五子棋 AI 的耗时都在算杀里
+    return ai
+
+def play_game(job):
+    """无界面下完一局, 返回结果字典 (供进程池调用, 参数打包成一个 dict)"""
+    gtype, size, seed = job['gtype'], job['size'], job['seed']
+    random.seed(seed)
+    game = GameFactory.create_game(gtype, size)
+    players = {BLACK: make_player(gtype, job['black'], job.get('time_limit')),
+               WHITE: make_player(gtype, job['white'], job.get('time_limit'))}
+    start = time.time()
+    # 随机开局, 让确定性的 AI 也能下出不同的棋
+    for _ in range(job.get('opening', 0)):
+        moves = game.get_valid_moves(game.current_player)
+        if not moves or game.game_over: break
+        game.place_stone(*random.choice(moves))
+
+    think = []
+    error = None # AI 给出非法着法时记下, 这局算出错而不是和棋
+    limit = size * size * 3
+    while not game.game_over and len(game.move_history) < limit:
+        t = time.time()
+        mover = game.current_player
+        mv = players[mover].get_move(game)
+        think.append(round((time.time() - t) * 1000, 2))
+        if mv:
+            suc, msg = game.place_stone(mv[0], mv[1])
+            if not suc: # 直接停下以免死循环
+                error = {"player": mover, "move": list(mv), "msg": msg, "ply": len(game.move_history)}; break
+        elif hasattr(game, 'pass_turn'): game.pass_turn()
+        else: game.game_over = True # 无棋可下
+    return {"id": job['id'], "type": gtype, "size": size, "seed": seed,
+            "black": job['black'], "white": job['white'],
+            "winner": game.winner if game.game_over else None, "finished": game.game_over, "error": error,
+            "moves": len(game.move_history), "think_ms": think,
+            "history": [list(m) if m != "PASS" else m for m in game.move_history],
+            "time": round(time.time() - start, 3)}
+
+def run_selfplay(gtype, n, size=None, black='ai', white='ai', workers=None,
+                 out=None, seed=0, opening=0, time_limit=None, on_result=None, archive=None):
+    """并行下 n 局, 每局结果逐行写入 out (JSONL), archive 给出时同时追加进该对局库; 返回汇总"""
+    size = size or DEFAULT_SIZE.get(gtype, 15)
+    jobs = [{"id": i, "gtype": gtype, "size": size, "seed": seed + i, "black": black,
+             "white": white, "opening": opening, "time_limit": time_limit} for i in range(n)]
+    summary = {"games": 0, "black_wins": 0, "white_wins": 0, "draws": 0, "unfinished": 0, "errors": 0,
+               "moves": 0, "think_ms": 0.0}
+    f = open(out, 'a', encoding='utf-8') if out else None
+    arc = None
+    if archive:
+        from game_archive import GameArchive, GameRecord, RESULT_DRAW, RESULT_NONE
+        arc = GameArchive(archive)
+    start = time.time()
+    try:
+        with Pool(workers) as pool:
+            for res in pool.imap_unordered(play_game, jobs):
+                if f: f.write(json.dumps(res) + "\n"); f.flush()
+                if arc is not None:
+                    result = (res["winner"] or RESULT_DRAW) if res["finished"] else RESULT_NONE
+                    arc.append(GameRecord(gtype, size, [m if m == "PASS" else tuple(m) for m in res["history"]],
+                                          res["black"], res["white"], result, int(time.time())))
+                summary["games"] += 1; summary["moves"] += res["moves"]
+                summary["think_ms"] += sum(res["think_ms"])
+                if res["error"]: summary["errors"] += 1
+                elif not res["finished"]: summary["unfinished"] += 1 # 到手数上限
+                elif res["winner"] == BLACK: summary["black_wins"] += 1
+                elif res["winner"] == WHITE: summary["white_wins"] += 1
+                else: summary["draws"] += 1
+                if on_result: on_result(res)
+    finally:
+        if f: f.close()
+        if arc is not None: arc.close()
+    el = time.time() - start
+    summary["time"] = round(el, 3)
+    summary["games_per_sec"] = round(summary["games"] / el, 3) if el > 0 else 0
+    summary["avg_moves"] = round(summary["moves"] / max(1, summary["games"]), 1)
+    summary["avg_think_ms"] = round(summary["think_ms"] / max(1, summary["moves"]), 2)
+    return summary
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="无界面 AI 自对弈")
+    ap.add_argument("game", choices=["gomoku", "reversi", "go"])
+    ap.add_argument("-n", "--games", type=int, default=10)
+    ap.add_argument("--size", type=int, default=None)
+    ap.add_argument("--black", default="ai", help="ai 或 random")
+    ap.add_argument("--white", default="ai", help="ai 或 random")
+    ap.add_argument("-j", "--workers", type=int, default=None, help="进程数, 默认 CPU 核数")
+    ap.add_argument("-o", "--out", default=None, help="结果 JSONL 文件 (追加)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--opening", type=int, default=0, help="开局随机步数")
+    ap.add_argument("--time", type=float, default=None, help="每步思考时间上限(秒)")
+    ap.add_argument("--archive", default=None, help="同时追加进对局库文件 (.gar)")
+    a = ap.parse_args(argv)
+
+    def progress(res):
+        err = f" 出错={res['error']}" if res['error'] else ""
+        print(f"#{res['id']} 胜方={res['winner']} 手数={res['moves']} 用时={res['time']}s{err}", file=sys.stderr)
+    s = run_selfplay(a.game, a.games, a.size, a.black, a.white, a.workers, a.out,
+                     a.seed, a.opening, a.time, on_result=progress, archive=a.archive)
+    print(json.dumps(s, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,114 @@
+import atexit
 import json
 import os
 import hashlib
+import sqlite3
+import time
 
-USER_FILE = "users.json"
+from ratings import DEFAULT_RATING, Leaderboard, elo_update
+
+USER_FILE = "users.json" # 旧版存档, 数据库不存在时导入一次
+USER_DB = "users.db"
+COMMIT_EVERY = 32 # 攒够这么多次写入, 或距上次提交超过 COMMIT_INTERVAL 秒, 才提交一次
+COMMIT_INTERVAL = 5.0
+
+class UserStore:
+    """SQLite 存储: 每次战绩更新只改一行, 写入攒批提交 (WAL 日志保证崩溃后库不损坏), 用到哪个用户才读哪个"""
+    def __init__(self, path=USER_DB, legacy=USER_FILE):
+        new = not os.path.exists(path)
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS users (name TEXT PRIMARY KEY, pwd TEXT NOT NULL, "
+                        "wins INTEGER NOT NULL DEFAULT 0, total INTEGER NOT NULL DEFAULT 0)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS ratings (name TEXT NOT NULL, gtype TEXT NOT NULL, "
+                        "rating REAL NOT NULL, games INTEGER NOT NULL, PRIMARY KEY (name, gtype))")
+        self.db.commit()
+        self.pending = 0
+        self.last_commit = time.time()
+        if new and legacy and os.path.exists(legacy): self._import_json(legacy)
+        atexit.register(self.close)
+
+    def _import_json(self, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f: users = json.load(f)
+        except (OSError, ValueError): return
+        self.db.executemany("INSERT OR IGNORE INTO users (name, pwd, wins, total) VALUES (?, ?, ?, ?)",
+                            [(n, u["pwd"], u.get("wins", 0), u.get("total", 0)) for n, u in users.items()])
+        self.db.commit()
+
+    def get(self, name):
+        row = self.db.execute("SELECT pwd, wins, total FROM users WHERE name = ?", (name,)).fetchone()
+        return {"pwd": row[0], "wins": row[1], "total": row[2]} if row else None
+
+    def add(self, name, pwd_hash):
+        """新用户立即提交; 已存在返回 False"""
+        cur = self.db.execute("INSERT OR IGNORE INTO users (name, pwd) VALUES (?, ?)", (name, pwd_hash))
+        self.flush()
+        return cur.rowcount == 1
+
+    def add_result(self, name, is_win):
+        self.db.execute("UPDATE users SET total = total + 1, wins = wins + ? WHERE name = ?", (int(bool(is_win)), name))
+        self._wrote()
+
+    def get_rating(self, name, gtype):
+        """(分数, 已计分局数), 没下过该棋种返回初始分"""
+        row = self.db.execute("SELECT rating, games FROM ratings WHERE name = ? AND gtype = ?", (name, gtype)).fetchone()
+        return row if row else (DEFAULT_RATING, 0)
+
+    def set_rating(self, name, gtype, rating, games):
+        self.db.execute("INSERT OR REPLACE INTO ratings (name, gtype, rating, games) VALUES (?, ?, ?, ?)",
+                        (name, gtype, rating, games))
+        self._wrote()
+
+    def ratings(self, gtype):
+        return self.db.execute("SELECT name, rating FROM ratings WHERE gtype = ?", (gtype,))
+
+    def all(self):
+        return {n: {"pwd": p, "wins": w, "total": t} for n, p, w, t in self.db.execute("SELECT name, pwd, wins, total FROM users")}
+
+    def _wrote(self):
+        self.pending += 1
+        if self.pending >= COMMIT_EVERY or time.time() - self.last_commit >= COMMIT_INTERVAL: self.flush()
+
+    def flush(self):
+        self.db.commit()
+        self.pending = 0
+        self.last_commit = time.time()
+
+    def close(self):
+        if self.db is None: return
+        self.flush(); self.db.close(); self.db = None
 
 class UserManager:
-    def __init__(self):
-        self.users = self._load()
+    def __init__(self, store=None):
+        self.store = store or UserStore()
+        self.cache = {} # 已读过的用户, 按需从库里取
+        self.boards = {} # 棋种 -> Leaderboard, 第一次查询时建, 之后随计分增量更新
         self.current_user = None
 
-    def _load(self):
-        if not os.path.exists(USER_FILE): return {}
-        try:
-            with open(USER_FILE, 'r', encoding='utf-8') as f: return json.load(f)
-        except: return {}
+    @property
+    def users(self):
+        """全部用户 (会读整张表, 只为兼容旧代码)"""
+        return self.store.all()
 
-    def _save(self):
-        with open(USER_FILE, 'w', encoding='utf-8') as f: json.dump(self.users, f, indent=4)
+    def _get(self, user):
+        if user not in self.cache:
+            u = self.store.get(user)
+            if u is None: return None
+            self.cache[user] = u
+        return self.cache[user]
 
     def register(self, user, pwd):
-        if user in self.users: return False, "用户已存在"
+        if self._get(user): return False, "用户已存在"
         if not user or not pwd: return False, "不能为空"
-        self.users[user] = {
-            "pwd": hashlib.md5(pwd.encode()).hexdigest(),
-            "wins": 0, "total": 0
-        }
-        self._save()
+        if not self.store.add(user, hashlib.md5(pwd.encode()).hexdigest()): return False, "用户已存在"
         return True, "注册成功"
 
     def login(self, user, pwd):
-        if user not in self.users: return False, "用户不存在"
-        if self.users[user]["pwd"] != hashlib.md5(pwd.encode()).hexdigest():
+        u = self._get(user)
+        if not u: return False, "用户不存在"
+        if u["pwd"] != hashlib.md5(pwd.encode()).hexdigest():
             return False, "密码错误"
         self.current_user = user
         return True, f"欢迎回来, {user}"
@@ -39,14 +117,56 @@ class UserManager:
         self.current_user = None
 
     def update_stats(self, is_win):
+        """给当前用户记一局胜负, 不计等级分: 本地对局的对手身份无从核实, 等级分只由 record_game 计"""
         if self.current_user:
-            self.users[self.current_user]["total"] += 1
-            if is_win: self.users[self.current_user]["wins"] += 1
-            self._save()
+            u = self._get(self.current_user)
+            u["total"] += 1
+            if is_win: u["wins"] += 1
+            self.store.add_result(self.current_user, is_win)
+
+    def record_game(self, gtype, a, b, score_a):
+        """服务端用: 双方都是注册用户时一起计分, score_a 为 a 的得分 (1/0.5/0)"""
+        if not (self._get(a) and self._get(b)): return False
+        ra, rb = self.rating(a, gtype), self.rating(b, gtype)
+        for name, res in ((a, score_a), (b, 1 - score_a)):
+            self._get(name)["total"] += 1
+            if res == 1: self._get(name)["wins"] += 1
+            self.store.add_result(name, res == 1)
+        self._rate(a, gtype, rb, score_a)
+        self._rate(b, gtype, ra, 1 - score_a)
+        return True
+
+    def _rate(self, name, gtype, opp_rating, score):
+        r, games = self.store.get_rating(name, gtype)
+        r = elo_update(r, opp_rating, score, games)
+        self.store.set_rating(name, gtype, r, games + 1)
+        if gtype in self.boards: self.boards[gtype].update(name, r)
+
+    def rating(self, user, gtype):
+        return self.store.get_rating(user, gtype)[0]
+
+    def leaderboard(self, gtype):
+        if gtype not in self.boards:
+            lb = self.boards[gtype] = Leaderboard()
+            for name, r in self.store.ratings(gtype): lb.update(name, r)
+        return self.boards[gtype]
+
+    def top(self, gtype, k=10, offset=0):
+        """排行榜: [(名次, 用户名, 分数), ...]"""
+        return self.leaderboard(gtype).top(k, offset)
+
+    def rank(self, user, gtype):
+        """用户在该棋种的名次, 没有计分过返回 None"""
+        return self.leaderboard(gtype).rank(user)
+
+    def check(self, user, pwd):
+        """只校验密码, 不改变当前登录用户"""
+        u = self._get(user)
+        return bool(u) and u["pwd"] == hashlib.md5(pwd.encode()).hexdigest()
 
     def get_user_data(self, username):
-        if not username or username not in self.users: return "游客"
-        u = self.users[username]
+        u = self._get(username) if username else None
+        if not u: return "游客"
         rate = 0
         if u['total'] > 0: rate = int((u['wins'] / u['total']) * 100)
-        return f"{username} (胜{u['wins']}/局{u['total']} {rate}%)"
\ No newline at end of file
+        return f"{username} (胜{u['wins']}/局{u['total']} {rate}%)"